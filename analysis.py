@@ -0,0 +1,81 @@
+import os
+from dataclasses import asdict
+
+import pandas as pd
+
+from fairness import fairness_report, outcome_values
+from ingest import DEFAULT_CHUNK_ROWS, StreamingAnalysis
+from representation import DEMOGRAPHIC_COLUMNS, Thresholds, find_flags, find_intersection_flags, group_counts
+
+# Headless analysis behind the Analyze tab; importing this module must not pull in streamlit or plotting
+
+
+# Which demographic columns the study reports
+def demographics_present(columns):
+    return {column: column in columns for column in DEMOGRAPHIC_COLUMNS}
+
+
+# Function to analyze bias in the dataset
+def analyze_bias(data, counts=None, thresholds=Thresholds()):
+    flags = []
+
+    # Check for demographics columns
+    demographics = demographics_present(data.columns)
+
+    # Bias detection logic
+    if not demographics["Race"]:
+        flags.append("No race demographic information is available.")
+    if not demographics["Age"]:
+        flags.append("No age demographic information is available.")
+    if not demographics["Gender"]:
+        flags.append("No gender demographic information is available.")
+
+    # Check for over/underrepresentation in every demographic column in one pass
+    if counts is None:
+        counts = group_counts(data)
+    for flag in find_flags(counts, thresholds):
+        flags.append(flag.message())
+
+    return flags
+
+
+# Audit one study CSV end to end, reading it in chunks so file size doesn't bound memory.
+# Intersectional flags are added when cell thresholds are given.
+# Returns a JSON-serializable record; failures are reported in the record instead of raised. A fairness
+# failure (e.g. a `positive` outcome value the study lacks) only costs the fairness section.
+def audit_study(path, summarize=False, chunk_rows=DEFAULT_CHUNK_ROWS, thresholds=Thresholds(),
+                cell_thresholds=None, positive=None):
+    record = {"file": os.fspath(path)}
+    try:
+        streaming = StreamingAnalysis()
+        with open(path, "rb") as file:
+            for chunk in pd.read_csv(file, chunksize=chunk_rows):
+                streaming.update(chunk)
+        columns = streaming.columns if streaming.columns is not None else []
+        record["rows"] = streaming.rows
+        record["demographics"] = demographics_present(columns)
+        record["flags"] = [asdict(flag) for flag in find_flags(streaming.counts, thresholds)]
+        record["messages"] = analyze_bias(pd.DataFrame(columns=columns), streaming.counts, thresholds)
+        try:
+            record["fairness"] = {
+                column: {"groups": groups.reset_index().to_dict("records"), "metrics": [asdict(m) for m in metrics]}
+                for column, (groups, metrics) in fairness_report(streaming.outcomes, positive=positive).items()
+            }
+            values = outcome_values(streaming.outcomes)
+            if not record["fairness"] and len(values) == 1:
+                record["fairness_note"] = f"Skipped: every participant has the same outcome ({values[0]})."
+            elif not record["fairness"] and values:
+                record["fairness_note"] = (f"Skipped: cannot tell which outcome value is positive among "
+                                           f"{', '.join(values)}; pass a positive value to choose it.")
+        except Exception as error:
+            record["fairness_error"] = f"{type(error).__name__}: {error}"
+        if cell_thresholds is not None and streaming.cube is not None:
+            record["intersections"] = [asdict(flag) for flag in
+                                       find_intersection_flags(streaming.cube, cell_thresholds)]
+        if summarize:
+            from llm import detect_bias
+
+            record["summary"] = detect_bias(streaming.sample, total_rows=streaming.rows)
+    except Exception as error:
+        record["error"] = f"{type(error).__name__}: {error}"
+    return record
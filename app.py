@@ -1,14 +1,6 @@
-import os
-
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-import altair as alt
-import numpy as np
-import openai
-import seaborn as sns
-from matplotlib import pyplot as plt
+
+# Heavier libraries are imported inside the tabs that use them to keep cold starts fast
 
 # Set page configuration
 st.set_page_config(
@@ -25,11 +17,31 @@ This dashboard explores and detects bias in AI models used in healthcare,
 and provides educational resources on how to mitigate these biases. 
 Analyze datasets, learn about bias in AI, and explore the impact of underrepresentation.
 """)
+
+
+# Feedback and quiz submissions are queued and written to SQLite in batches by one background thread per process
+@st.cache_resource(show_spinner=False)
+def submission_writer():
+    from persistence import SubmissionWriter
+
+    return SubmissionWriter()
+
+
+# Anonymous id grouping a session's submissions
+if "session_id" not in st.session_state:
+    import uuid
+
+    st.session_state["session_id"] = uuid.uuid4().hex
+
 # Feedback Section in Sidebar
 st.sidebar.title("Feedback")
 feedback = st.sidebar.text_area("We value your feedback!", "")
 if st.sidebar.button("Submit Feedback"):
-    st.sidebar.write("Thank you for your feedback!")
+    if not feedback.strip():
+        st.sidebar.warning("Please write some feedback first.")
+    else:
+        submission_writer().submit_feedback(feedback.strip(), st.session_state["session_id"])
+        st.sidebar.write("Thank you for your feedback!")
 
 # Embed the CSS for consistent styling
 background_image = """
@@ -132,6 +144,8 @@ tabs = st.tabs(["🏠 Home", "🔍 Discover", "📖 Learn", "📊 Analyze", "
 
 # Home tab
 with tabs[0]:
+    from participation import configured_table, participation_figures
+
     st.markdown("""
         <section id="home">
             <div class="section-container">
@@ -163,57 +177,35 @@ with tabs[0]:
         <h1> </h1>
         """, unsafe_allow_html=True)
 
-    # Generate continuous data for ages 18 to 80 for both male and female participation
-    ages = np.linspace(18, 80, 100)  # 100 points between ages 18 to 80
-    races = np.arange(5)  # Represent races as 0 to 4 (White, Black, Hispanic, Asian, Other)
-    race_labels = ["White", "Black", "Hispanic", "Asian", "Other"]
+    # Participation surfaces are built once per process and shared by every session and rerun
+    @st.cache_resource(show_spinner=False)
+    def shared_participation_figures(table_path, table_modified):
+        return participation_figures(table_path)
 
-    # Meshgrid for surface plot
-    X, Y = np.meshgrid(ages, races)
 
-    # Simulate male and female participation data (higher for males, lower for females)
-    Z_male = np.random.normal(60, 10, (5, 100)) + 20 * (races[:, None] == 0)  # White males higher participation
-    Z_female = np.random.normal(40, 10, (5, 100)) + 10 * (races[:, None] == 0)  # White females slightly higher
+    # A bad PARTICIPATION_TABLE setting falls back to the hypothetical surfaces instead of breaking every rerun
+    try:
+        table_path, table_modified = configured_table()
+        participation = shared_participation_figures(table_path, table_modified)
+    except (OSError, ValueError) as error:
+        st.warning(f"The participation table could not be loaded ({error}); showing hypothetical participation.")
+        table_path = None
+        participation = shared_participation_figures(None, None)
 
     col1, col2 = st.columns(2)
 
-    # Create the 3D Surface Plot for Male Participation
+    # 3D Surface Plot for Male Participation
     with col1:
         st.markdown("### Male Participation in Medical Research by Race and Age")
-        fig_male_surface = go.Figure(data=[go.Surface(z=Z_male, x=X, y=Y, colorscale='Viridis')])
-
-        fig_male_surface.update_layout(
-            title="Male Participation (%)",
-            scene=dict(
-                xaxis_title='Age',
-                yaxis=dict(
-                    title='Race',
-                    tickvals=[0, 1, 2, 3, 4],
-                    ticktext=race_labels
-                ),
-                zaxis_title='Participation (%)'
-            )
-        )
-        st.plotly_chart(fig_male_surface)
+        st.plotly_chart(participation["Male"])
 
-    # Create the 3D Surface Plot for Female Participation
+    # 3D Surface Plot for Female Participation
     with col2:
         st.markdown("### Female Participation in Medical Research by Race and Age")
-        fig_female_surface = go.Figure(data=[go.Surface(z=Z_female, x=X, y=Y, colorscale='Viridis')])
-
-        fig_female_surface.update_layout(
-            title="Female Participation (%)",
-            scene=dict(
-                xaxis_title='Age',
-                yaxis=dict(
-                    title='Race',
-                    tickvals=[0, 1, 2, 3, 4],
-                    ticktext=race_labels
-                ),
-                zaxis_title='Participation (%)'
-            )
-        )
-        st.plotly_chart(fig_female_surface)
+        st.plotly_chart(participation["Female"])
+
+    if table_path:
+        st.caption(f"Participation rates loaded from {table_path}.")
 
     # Sources and Explanation
     st.markdown("""
@@ -236,6 +228,11 @@ with tabs[0]:
 
 # Explore Bias tab
 with tabs[1]:
+    import numpy as np
+    import plotly.graph_objects as go
+
+    from scoring import GENDERS, RACES, BiasWeights, cohort_summary, score_patients, sensitivity_grid
+
     st.markdown("### Explore the Effect of Bias by Changing Input Factors")
 
     col1, col2 = st.columns(2)
@@ -244,25 +241,16 @@ with tabs[1]:
     with col1:
         age = st.slider('Patient Age', 18, 100, 50)
         income = st.slider('Patient Income', 20000, 200000, 60000)
-        race = st.selectbox('Patient Race', ['White', 'Black', 'Hispanic', 'Asian', 'Other'])
-        gender = st.selectbox('Patient Gender', ['Male', 'Female', 'Other'])
+        race = st.selectbox('Patient Race', RACES)
+        gender = st.selectbox('Patient Gender', GENDERS)
 
         st.write(f"Selected Age: {age}, Income: ${income}, Race: {race}, Gender: {gender}")
 
-    # Define weightings for bias severity based on factors
-    race_weights = {'White': 0.1, 'Black': 0.3, 'Hispanic': 0.25, 'Asian': 0.2, 'Other': 0.15}
-    gender_weights = {'Male': 0.1, 'Female': 0.25, 'Other': 0.3}
-
-    # Calculate bias score using weighted factors
-    race_bias = race_weights[race]
-    gender_bias = gender_weights[gender]
-
-    # Use income and age to adjust the bias score
-    income_bias = 0.25 if income < 50000 else 0.1  # Lower income tends to increase bias
-    age_bias = 0.2 if age > 60 else 0.1  # Older patients tend to experience more bias
-
-    # Final bias score calculation (just a simple weighted sum)
-    bias_score = (race_bias + gender_bias + income_bias + age_bias) * 100
+    # Bias severity uses the same weighted scoring as whole-cohort scoring below
+    weights = BiasWeights()
+    bias_score = float(score_patients(
+        {'Age': [age], 'Income': [income], 'Race': [race], 'Gender': [gender]}, weights
+    )[0])
 
     # Display bias severity gauge
     with col2:
@@ -275,6 +263,63 @@ with tabs[1]:
         ))
         st.plotly_chart(fig)
 
+    # Every age x income x race x gender combination is scored once and sliced as the inputs change
+    GRID_AGES = np.arange(18, 101)
+    GRID_INCOMES = np.arange(20000, 200001, 5000)
+
+
+    @st.cache_resource(show_spinner=False)
+    def shared_sensitivity_grid(weights):
+        return sensitivity_grid(GRID_AGES, GRID_INCOMES, RACES, GENDERS, weights)
+
+
+    grid = shared_sensitivity_grid(weights)
+    st.markdown("### Bias Severity Across All Patients")
+    col3, col4 = st.columns(2)
+    with col3:
+        st.markdown(f"**By age and income** ({race}, {gender})")
+        fig = go.Figure(go.Heatmap(
+            z=grid[:, :, RACES.index(race), GENDERS.index(gender)].T, x=GRID_AGES, y=GRID_INCOMES,
+            colorscale='Reds', zmin=0, zmax=100, colorbar={'title': 'Severity'}
+        ))
+        fig.update_layout(xaxis_title='Age', yaxis_title='Income')
+        st.plotly_chart(fig)
+    with col4:
+        age_index = int(np.searchsorted(GRID_AGES, age))
+        income_index = min(int(np.searchsorted(GRID_INCOMES, income, side='right')) - 1, GRID_INCOMES.size - 1)
+        st.markdown(f"**By race and gender** (age {age}, income ${GRID_INCOMES[income_index]:,})")
+        fig = go.Figure(go.Heatmap(
+            z=grid[age_index, income_index], x=list(GENDERS), y=list(RACES),
+            colorscale='Reds', zmin=0, zmax=100, colorbar={'title': 'Severity'}
+        ))
+        fig.update_layout(xaxis_title='Gender', yaxis_title='Race')
+        st.plotly_chart(fig)
+
+    # Score a whole cohort in one pass
+    with st.expander("Score a patient cohort"):
+        cohort_file = st.file_uploader("Upload a cohort with Age, Income, Race and Gender columns", type="csv")
+        if cohort_file:
+            import pandas as pd
+
+            cohort = pd.read_csv(cohort_file)
+            missing = {'Age', 'Income', 'Race', 'Gender'} - set(cohort.columns)
+            if missing:
+                st.error(f"The cohort is missing columns: {', '.join(sorted(missing))}")
+            else:
+                cohort_scores = score_patients(cohort, weights)
+                summary = cohort_summary(cohort, cohort_scores, weights)
+                metrics = st.columns(4)
+                metrics[0].metric("Patients", f"{summary['patients']:,}")
+                metrics[1].metric("Mean severity", f"{summary['mean']:.1f}")
+                metrics[2].metric("90th percentile", f"{summary['p90']:.1f}")
+                metrics[3].metric("High severity", f"{summary['high_severity_share']:.1%}")
+                if summary['unscored']:
+                    st.write(f"{summary['unscored']:,} patients have a race or gender without a weight and were not scored.")
+                st.write(pd.DataFrame({
+                    'Mean severity by race': pd.Series(summary['mean_by_race']),
+                    'Mean severity by gender': pd.Series(summary['mean_by_gender']),
+                }))
+
     # Explanation of the bias score calculation
     st.markdown("""
     ### How is the bias severity calculated?
@@ -355,150 +400,176 @@ with tabs[2]:
             """, unsafe_allow_html=True)
 # Analyze Data tab (Tab 3)
 with tabs[3]:
-    # ChatGPT API key (replace with your own key)
-    openai.api_key = os.getenv("OPENAI_API_KEY")
+    # Stage timing is standard library only, so it loads with the tab
+    from instrumentation import span, traced
+
     # Streamlit app setup
     st.title("Medical Study Bias Detector")
 
+    # Seconds between checks for a pending dataset summary
+    SUMMARY_POLL_SECONDS = 1.0
+
     # Upload CSV file
     uploaded_file = st.file_uploader("Upload Medical Study CSV", type="csv")
-
-
-    # Function to call ChatGPT and get bias analysis
-    def detect_bias(data):
-        # Convert the DataFrame to CSV format (as a string) for easier transmission to ChatGPT
-        csv_data = data.to_csv(index=False)
-
-        # Send the dataset to ChatGPT for analysis
-        response = openai.ChatCompletion.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert in medical studies. Analyze this study's dataset and summarize it."
-                },
-                {
-                    "role": "user",
-                    "content": f"""
-
-                        Here is the dataset in CSV format:
-                        ```
-                        {csv_data}
-                        ```                    
-                        For your output, write one short paragraph (maximum two sentences) of what is happening in this dataset, focusing on the results (for example, whether or not people responded to a new treatment, or whether or not a tumor is malignant or benign). Do not list the columns of the database.
-                    """
-                }
-            ]
-        )
-
-        # Parse ChatGPT response
-        chat_response = response['choices'][0]['message']['content']
-        return chat_response
-
-
-    # Function to analyze bias in the dataset
-    def analyze_bias(data):
-        flags = []
-
-        # Check for demographics columns
-        demographics = {
-            "Race": "Race" in data.columns,
-            "Age": "Age" in data.columns,
-            "Gender": "Gender" in data.columns
-        }
-
-        # Bias detection logic
-        if not demographics["Race"]:
-            flags.append("No race demographic information is available.")
-        if not demographics["Age"]:
-            flags.append("No age demographic information is available.")
-        if not demographics["Gender"]:
-            flags.append("No gender demographic information is available.")
-
-        # Check for over/underrepresentation in race
-        if demographics["Race"]:
-            race_counts = data["Race"].value_counts(normalize=True) * 100
-            for race, percentage in race_counts.items():
-                if percentage > 60:
-                    flags.append(f"{race} participants are overrepresented ({percentage:.2f}%).")
-                elif percentage < 10:
-                    flags.append(f"{race} participants are underrepresented ({percentage:.2f}%).")
-
-        # Check for over/underrepresentation in age
-        if demographics["Age"]:
-            age_counts = data["Age"].value_counts(normalize=True) * 100
-            for age, percentage in age_counts.items():
-                if percentage > 60:
-                    flags.append(f"Age group {age} participants are overrepresented ({percentage:.2f}%).")
-                elif percentage < 10:
-                    flags.append(f"Age group {age} participants are underrepresented ({percentage:.2f}%).")
-
-        # Check for over/underrepresentation in gender
-        if demographics["Gender"]:
-            gender_counts = data["Gender"].value_counts(normalize=True) * 100
-            for gender, percentage in gender_counts.items():
-                if percentage > 60:
-                    flags.append(f"{gender} participants are overrepresented ({percentage:.2f}%).")
-                elif percentage < 10:
-                    flags.append(f"{gender} participants are underrepresented ({percentage:.2f}%).")
-
-        return flags
-
-
-    # Dashboard plots for analysis
-    def plot_dashboard(data):
-        fig, axs = plt.subplots(2, 2, figsize=(14, 10))
-        fig.patch.set_facecolor('black')
-
-        # Gender Distribution (Pie chart)
-        gender_distribution_data = data['Gender'].value_counts()
-        axs[0, 0].pie(gender_distribution_data, labels=gender_distribution_data.index, autopct='%1.1f%%',
-                      colors=['#1f77b4', '#ff7f0e'])
-        axs[0, 0].set_title('Gender Distribution', color='white')
-        axs[0, 0].set_facecolor('black')
-
-        # Age Group Distribution (Bar chart)
-        age_distribution_data = data['Age'].value_counts()
-        sns.barplot(x=age_distribution_data.index, y=age_distribution_data.values, ax=axs[0, 1], palette='Set2')
-        axs[0, 1].set_title('Age Group Distribution', color='white')
-        axs[0, 1].set_xlabel('Age Group', color='white')
-        axs[0, 1].set_ylabel('Count', color='white')
-        axs[0, 1].set_facecolor('black')
-
-        # Response Rate by Gender (Stacked bar chart)
-        response_by_gender = data.groupby(['Gender', 'Response']).size().reset_index(name='Count')
-        sns.barplot(x='Gender', y='Count', hue='Response', data=response_by_gender, ax=axs[1, 0], palette='coolwarm')
-        axs[1, 0].set_title('Response Rate by Gender', color='white')
-        axs[1, 0].set_ylabel('Count', color='white')
-        axs[1, 0].set_facecolor('black')
-
-        # Time on Medication by Age Group (Box plot)
-        sns.boxplot(x='Age', y='Time taking medication', data=data, hue='Gender', ax=axs[1, 1], palette='pastel')
-        axs[1, 1].set_title('Time on Medication by Age Group', color='white')
-        axs[1, 1].set_ylabel('Years on Medication', color='white')
-        axs[1, 1].set_facecolor('black')
-
-        # Adjust layout
-        plt.tight_layout()
-
-        # Render the dashboard in Streamlit
-        st.pyplot(fig)
+    if uploaded_file:
+        # The analysis stack (pandas, pyarrow, matplotlib, openai) only loads once a study is uploaded
+        import pandas as pd
+
+        from analysis import analyze_bias, demographics_present
+        from dashboard import dashboard_aggregates, plot_dashboard
+        from fairness import fairness_report, outcome_values, positive_value
+        from incremental import StudyState, StudyStore, read_new_rows
+        from ingest import STREAMING_THRESHOLD_BYTES, StreamingAnalysis, read_csv_chunks
+        from llm import submit_detect_bias
+        from representation import CellThresholds, find_intersection_flags
+        from schema import optimize_dtypes
+    stream_upload = st.checkbox(
+        "Stream the file in chunks (for very large studies)",
+        value=bool(uploaded_file) and uploaded_file.size > STREAMING_THRESHOLD_BYTES
+    )
+    reuse_saved = st.checkbox("Only read the new rows when an upload extends an earlier one", value=True)
+    intersectional = st.checkbox("Intersectional analysis (Race × Age group × Gender)")
+
+
+    # Parse the upload and store its preview, rows and counts in the result cache.
+    # Every upload leaves a saved analysis state behind, so a later upload that appends rows to the
+    # same file only has to read the new rows.
+    def load_study(uploaded_file, mode, scan, results, study_key):
+        # Rows from every demographic group rather than the first few of the file. Streamed studies show it as
+        # soon as the first chunk is read, and refresh it once the whole study has been read
+        st.write("Uploaded data preview:")
+        preview_slot = st.empty()
+        store = StudyStore()
+        state = store.load(scan.previous) if mode == "incremental" else None
+        if mode == "full":
+            with span("parse_csv") as stage:
+                data = pd.read_csv(uploaded_file)
+                stage.rows = len(data)
+            # Categorical demographics and downcast numbers keep each session's copy small
+            with span("optimize_dtypes", rows=len(data)):
+                data, schema_report = optimize_dtypes(data)
+            with span("count_tables", rows=len(data)):
+                analysis = StreamingAnalysis()
+                analysis.update(data)
+            with span("dashboard_aggregates", rows=len(data)):
+                dashboard = dashboard_aggregates(data, sample=analysis.sample)
+        else:
+            # Read in bounded chunks; counts are exact and plots use a bounded stratified sample of rows
+            if state is not None:
+                analysis = state.analysis
+                saved_rows = analysis.rows
+                chunks = read_new_rows(uploaded_file, state, scan.size)
+            else:
+                analysis = StreamingAnalysis()
+                chunks = read_csv_chunks(uploaded_file)
+            if analysis.rows:
+                preview_slot.write(analysis.preview)
+            progress = st.progress(0.0, text="Reading study data...")
+            with span("stream_csv", mode=mode) as stage:
+                for chunk, fraction in chunks:
+                    first_chunk = analysis.rows == 0
+                    analysis.update(chunk)
+                    if first_chunk:
+                        preview_slot.write(analysis.preview)
+                    progress.progress(fraction or 0.0, text=f"Read {analysis.rows:,} rows...")
+                stage.rows = analysis.rows - (saved_rows if state is not None else 0)
+            progress.empty()
+            with span("optimize_dtypes", rows=len(analysis.sample)):
+                data, schema_report = optimize_dtypes(analysis.sample)
+            dashboard = analysis.dashboard_aggregates()
+        preview_slot.write(analysis.preview)
+        if state is None or state.size != scan.size:
+            store.save(StudyState(scan.digest, scan.size, scan.header, analysis))
+
+        origin = None
+        if state is not None and state.size == scan.size:
+            origin = f"This study was analyzed before; reused the saved analysis of its {saved_rows:,} rows."
+        elif state is not None:
+            origin = (f"This upload extends an earlier one: read {analysis.rows - saved_rows:,} new rows on top of "
+                      f"{saved_rows:,} already analyzed.")
+        results.put(study_key, "origin", origin)
+        results.put(study_key, "preview", analysis.preview)
+        results.put(study_key, "rows", analysis.rows)
+        results.put(study_key, "data", data)
+        results.put(study_key, "schema", schema_report)
+        results.put(study_key, "counts", analysis.counts)
+        results.put(study_key, "cube", analysis.cube)
+        results.put(study_key, "outcomes", analysis.outcomes)
+        results.put(study_key, "dashboard", dashboard)
+
+
+    # Results shared by every session and worker process; identical uploads are analyzed once per deployment
+    @st.cache_resource(show_spinner=False)
+    def shared_results():
+        from cache import SharedCache
+
+        return SharedCache.from_environment()
+
+
+    # This session's result cache, backed by the shared one
+    def session_results():
+        from cache import ResultCache
+
+        if "result_cache" not in st.session_state:
+            st.session_state["result_cache"] = ResultCache(shared=shared_results())
+        return st.session_state["result_cache"]
 
 
     # Process CSV file and detect bias
-    if uploaded_file:
-        data = pd.read_csv(uploaded_file)
-        st.write("Uploaded data preview:")
-        st.write(data.head())
+    if not uploaded_file and "summary_job" in st.session_state:
+        st.session_state.pop("summary_job").cancel()
 
-        # Call the bias detection function
-        with st.spinner("Analyzing data for possible bias..."):
-            bias_report = detect_bias(data)
+    if uploaded_file:
+        # Results are cached per file content, so reruns on the same upload skip re-analysis
+        results = session_results()
+        scans = st.session_state.setdefault("upload_scans", {})
+        upload_id = getattr(uploaded_file, "file_id", None) or uploaded_file.name
+        if upload_id not in scans:
+            # Fingerprints the upload and looks for a saved analysis of a prefix of it in the same pass
+            scans[upload_id] = StudyStore().scan(uploaded_file)
+        scan = scans[upload_id]
+        study_parts = ("origin", "preview", "rows", "data", "schema", "counts", "cube", "outcomes", "dashboard")
+        mode = "stream" if stream_upload else "full"
+        # Results another session computed for the same file beat resuming a saved state
+        if reuse_saved and scan.previous and not results.contains(f"{scan.digest}:{mode}", "origin"):
+            mode = "incremental"
+        study_key = f"{scan.digest}:{mode}"
+        # The read mode only shapes the analysis state; the dataset summary is kept per file content, so reading
+        # the same file another way does not ask the model again
+        report_key = scan.digest
+
+        if all(results.contains(study_key, part) for part in study_parts):
+            st.write("Uploaded data preview:")
+            st.write(results.get(study_key, "preview"))
+        else:
+            load_study(uploaded_file, mode, scan, results, study_key)
+        if results.get(study_key, "origin"):
+            st.info(results.get(study_key, "origin"))
+        st.caption(results.get(study_key, "schema").message())
+        columns = results.get(study_key, "preview").columns
+        study_rows = results.get(study_key, "rows")
+
+
+        # Start the bias detection request in the background; a new upload cancels the old request
+        # (even when the new upload's report is already cached)
+        summary_job = st.session_state.get("summary_job")
+        if summary_job is not None and summary_job.key != report_key:
+            st.session_state.pop("summary_job").cancel()
+            summary_job = None
+        if not results.contains(report_key, "report") and summary_job is None:
+            summary_job = submit_detect_bias(report_key, results.get(study_key, "data"), dataset_key=report_key,
+                                             total_rows=results.get(study_key, "rows"))
+            st.session_state["summary_job"] = summary_job
 
         st.subheader("Bias Report")
 
         # Step 1: Bias report
-        bias_flags = analyze_bias(data)
+        bias_flags = results.get_or_compute(
+            study_key, "flags",
+            traced("analyze_bias",
+                   lambda: analyze_bias(results.get(study_key, "preview"), results.get(study_key, "counts")),
+                   rows=study_rows)
+        )
         if len(bias_flags) == 0:
             st.write("No Bias detected.")
         else:
@@ -509,17 +580,155 @@ with tabs[3]:
 
         # Step 2: Demographics information
         st.subheader("Demographics Information")
-        st.write(f"Race demographics: {'Present' if 'Race' in data.columns else 'Not Detected'}")
-        st.write(f"Age demographics: {'Present' if 'Age' in data.columns else 'Not Detected'}")
-        st.write(f"Gender demographics: {'Present' if 'Gender' in data.columns else 'Not Detected'}")
-
-        # Step 3: GPT API for bias flag
+        demographics = demographics_present(columns)
+        st.write(f"Race demographics: {'Present' if demographics['Race'] else 'Not Detected'}")
+        st.write(f"Age demographics: {'Present' if demographics['Age'] else 'Not Detected'}")
+        st.write(f"Gender demographics: {'Present' if demographics['Gender'] else 'Not Detected'}")
+
+        # Combinations of groups that the per-column shares can hide, e.g. older women of one race
+        if intersectional:
+            st.subheader("Intersectional Analysis")
+            min_col, ratio_col, dominant_col = st.columns(3)
+            cell_thresholds = CellThresholds(
+                min_count=min_col.number_input("Minimum participants per cell", min_value=0,
+                                               value=CellThresholds.min_count),
+                under_ratio=ratio_col.number_input("Sparse below this share of expected", min_value=0.0,
+                                                   max_value=1.0, value=CellThresholds.under_ratio, step=0.05),
+                dominant=dominant_col.number_input("Over-dominant above (% of participants)", min_value=0.0,
+                                                   max_value=100.0, value=CellThresholds.dominant, step=5.0),
+            )
+            cell_flags = results.get_or_compute(
+                study_key, f"intersection_flags:{cell_thresholds}",
+                traced("intersections",
+                       lambda: find_intersection_flags(results.get(study_key, "cube"), cell_thresholds),
+                       rows=study_rows)
+            )
+            if results.get(study_key, "cube").index.nlevels < 2:
+                st.write("At least two demographic columns are needed for an intersectional analysis.")
+            elif not cell_flags:
+                st.write("No sparse or over-dominant combinations detected.")
+            else:
+                st.write(f"{len(cell_flags)} combinations flagged.")
+                st.dataframe(pd.DataFrame([
+                    {**dict(flag.groups), "Participants": flag.count, "Share (%)": round(flag.share, 2),
+                     "Expected (%)": round(flag.expected_share, 2), "Flag": flag.kind}
+                    for flag in cell_flags
+                ]), hide_index=True)
+
+        # Outcome rates by group with bootstrap confidence intervals
+        st.subheader("Fairness Metrics")
+        found_outcomes = outcome_values(results.get(study_key, "outcomes"))
+        positive = None
+        if len(found_outcomes) == 1:
+            st.write(f"Every participant has the same Response ({found_outcomes[0]}), so there are no outcome "
+                     "rates to compare.")
+        elif found_outcomes and positive_value(found_outcomes) is None:
+            # Labels like Malignant/Benign or Improved/No change don't say which outcome is the positive one
+            positive = st.selectbox("Which Response value is the positive outcome?", [None, *found_outcomes],
+                                    format_func=lambda value: "Choose a value..." if value is None else value)
+            if positive is None:
+                st.write("Fairness metrics are skipped until the positive outcome is chosen.")
+        fairness = results.get_or_compute(
+            study_key, "fairness" if positive is None else f"fairness:{positive}",
+            traced("fairness", lambda: fairness_report(results.get(study_key, "outcomes"), positive=positive),
+                   rows=study_rows)
+        )
+        if not fairness and (not found_outcomes or positive is not None or positive_value(found_outcomes)):
+            st.write("No Response column with at least two demographic groups was found.")
+        for column, (group_table, metrics) in fairness.items():
+            st.markdown(f"**{column}**")
+            st.dataframe(group_table.style.format("{:.1%}", subset=group_table.columns[1:]))
+            st.dataframe(pd.DataFrame([
+                {"Metric": metric.name, "Value": metric.value, "95% CI low": metric.low, "95% CI high": metric.high}
+                for metric in metrics
+            ]).style.format("{:.3f}", subset=["Value", "95% CI low", "95% CI high"]), hide_index=True)
+
+        # Step 3: GPT API for bias flag, polled until the background request finishes
         st.subheader("Dataset Summary")
-        st.write(bias_report)
+        summary_pending = not results.contains(report_key, "report") and not summary_job.done()
+
+
+        @st.fragment(run_every=SUMMARY_POLL_SECONDS if summary_pending else None)
+        def dataset_summary():
+            if not results.contains(report_key, "report"):
+                if not summary_job.done():
+                    st.info("Analyzing data for possible bias...")
+                    return
+                if summary_job.future.exception() is None:
+                    results.put(report_key, "report", summary_job.result())
+                if summary_pending:
+                    # Rerun the whole app so the finished fragment stops polling
+                    st.rerun()
+                if summary_job.future.exception() is not None:
+                    st.warning(f"The dataset summary is unavailable: {summary_job.future.exception()}")
+                    # Forget the failed request so the next rerun or upload tries again
+                    if st.session_state.get("summary_job") is summary_job:
+                        del st.session_state["summary_job"]
+                    return
+            st.write(results.get(report_key, "report"))
+
+
+        dataset_summary()
 
         # Render the dashboard
         st.subheader("Dashboard")
-        plot_dashboard(data)
+        st.image(results.get_or_compute(
+            study_key, "dashboard_image",
+            traced("plot_dashboard", lambda: plot_dashboard(results.get(study_key, "dashboard")))
+        ))
+
+    # Many studies at once, each compared with a reference population instead of fixed share thresholds
+    st.subheader("Compare Studies with a Reference Population")
+    comparison_files = st.file_uploader("Upload study CSVs to compare", type="csv", accept_multiple_files=True)
+    reference_file = st.file_uploader(
+        "Reference distribution (optional)", type="csv",
+        help="Group shares or counts by Race, Gender and/or Age, either as columns with a Share/Percent/Count "
+             "column or as Column,Group,Share rows. US census shares are used when none is given."
+    )
+    if comparison_files:
+        import pandas as pd
+
+        from cache import fingerprint
+        from reference import DEFAULT_REFERENCE, compare_studies, count_study, load_reference
+
+        results = session_results()
+        try:
+            reference = load_reference(reference_file if reference_file else DEFAULT_REFERENCE)
+        except (ValueError, pd.errors.ParserError) as error:
+            st.error(f"The reference distribution could not be read: {error}")
+            reference = None
+        if reference is not None:
+            # Group counts are cached per file content, so only newly added studies are read. Each upload is
+            # hashed once; reruns find its fingerprint by upload id, like the main uploader's scans
+            known = st.session_state.get("comparison_fingerprints", {})
+            fingerprints = {}
+            study_counts = {}
+            progress = st.progress(0.0, text="Counting study groups...")
+            for position, study_file in enumerate(comparison_files, start=1):
+                upload_id = getattr(study_file, "file_id", None) or study_file.name
+                fingerprints[upload_id] = known.get(upload_id) or fingerprint(study_file)
+                study_counts[study_file.name] = results.get_or_compute(
+                    fingerprints[upload_id], "group_counts",
+                    traced("count_study", lambda study_file=study_file: count_study(study_file))
+                )
+                progress.progress(position / len(comparison_files), text=f"Counted {position:,} studies...")
+            progress.empty()
+            # Only the current uploads are kept
+            st.session_state["comparison_fingerprints"] = fingerprints
+            with span("compare_studies", rows=len(study_counts)):
+                ranking, ratios = compare_studies(study_counts, reference)
+            st.write("Studies ranked by how far their demographics diverge from the reference (KL divergence "
+                     "summed over columns). A p-value near 0 means the difference is unlikely to be chance. Studies "
+                     "with no usable Race, Gender or Age data have no divergence and are listed last.")
+            st.dataframe(ranking.style.format(
+                {column: "{:.3g}" for column in ranking.columns if column.endswith(("χ²", "p-value"))}
+                | {column: "{:.4f}" for column in ranking.columns if "bits" in column}
+                | {column: "{:.2f}" for column in ranking.columns if column.endswith(("ratio", "(%)"))},
+                na_rep="–"
+            ), hide_index=True)
+            with st.expander("Representation ratio of every group (study share ÷ reference share)"):
+                st.dataframe(ratios.style.format("{:.2f}", subset=["Study share (%)", "Reference share (%)",
+                                                                   "Ratio"], na_rep="–"), hide_index=True)
 # Quiz tab (replaces recommendations)
 with tabs[4]:
     st.title("Bias in AI Quiz")
@@ -554,6 +763,12 @@ with tabs[4]:
             score += 1
 
         st.write(f"Your score: {score}/3")
+        writer = submission_writer()
+        writer.submit_quiz(score, 3, {"q1": q1, "q2": q2, "q3": q3}, st.session_state["session_id"])
+        quiz_stats = writer.quiz_stats(3)
+        if quiz_stats.submissions:
+            st.caption(f"You scored higher than {quiz_stats.percentile(score):.0%} of the "
+                       f"{quiz_stats.submissions:,} earlier attempt{'s' if quiz_stats.submissions != 1 else ''} (average {quiz_stats.mean_score:.1f}/3).")
 
         if score == 3:
             st.success("Congratulations! You have a strong understanding of bias in AI.")
@@ -561,3 +776,30 @@ with tabs[4]:
             st.warning("Good job! But there’s room for improvement.")
         else:
             st.error("You might want to review the material again.")
+
+# Recent stage timings, shown when instrumentation is enabled (BIAS_DETECTOR_INSTRUMENTATION=1).
+# Rendered last so it includes the stages of the current run.
+from instrumentation import instrumentation
+
+if instrumentation.enabled:
+    with st.sidebar.expander("Diagnostics"):
+        recent_spans = instrumentation.recent(20)
+        if recent_spans:
+            st.dataframe([
+                {"Stage": recorded.name, "Seconds": round(recorded.seconds, 3), "Rows": recorded.rows,
+                 "Memory Δ (MiB)": round(recorded.memory_delta / 2 ** 20, 1),
+                 "Details": ", ".join(f"{key}={value}" for key, value in recorded.attributes.items())}
+                for recorded in reversed(recent_spans)
+            ], hide_index=True)
+        else:
+            st.write("No stages recorded yet.")
+        st.download_button("Download JSON log", instrumentation.json_lines(), file_name="stages.jsonl")
+        st.download_button("Download Prometheus metrics", instrumentation.prometheus_text(),
+                           file_name="bias_detector.prom")
+        shared = getattr(st.session_state.get("result_cache"), "shared", None)
+        if shared is not None:
+            cache_stats = shared.stats()
+            st.caption(f"Shared result cache: {cache_stats['entries']:,} entries, "
+                       f"{cache_stats['bytes'] / 2 ** 20:.1f} MiB, {cache_stats['hit_rate']:.0%} hit rate "
+                       f"({cache_stats['hits']:,} hits, {cache_stats['misses']:,} misses, "
+                       f"{cache_stats['evictions'] + cache_stats['expirations']:,} evicted).")
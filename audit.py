@@ -0,0 +1,68 @@
+import argparse
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from pathlib import Path
+
+from analysis import audit_study
+from representation import CellThresholds, Thresholds
+
+
+# Study CSVs under the directory, in a stable order
+def find_studies(directory, pattern="*.csv", recursive=False):
+    root = Path(directory)
+    return sorted(root.rglob(pattern) if recursive else root.glob(pattern))
+
+
+# Audit every study across a process pool, yielding records as they finish
+def audit_directory(directory, pattern="*.csv", recursive=False, workers=None, summarize=False,
+                    thresholds=Thresholds(), cell_thresholds=None, positive=None):
+    studies = find_studies(directory, pattern, recursive)
+    audit = partial(audit_study, summarize=summarize, thresholds=thresholds, cell_thresholds=cell_thresholds,
+                    positive=positive)
+    if workers == 1:
+        yield from map(audit, studies)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(audit, study) for study in studies]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Audit a directory of study CSVs for demographic bias.")
+    parser.add_argument("directory", help="directory containing study CSV files")
+    parser.add_argument("--pattern", default="*.csv", help="glob for study files (default: *.csv)")
+    parser.add_argument("--recursive", action="store_true", help="search subdirectories too")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--summarize", action="store_true", help="also request a detect_bias summary per study")
+    parser.add_argument("--over", type=float, default=Thresholds.over, help="overrepresentation threshold (%%)")
+    parser.add_argument("--under", type=float, default=Thresholds.under, help="underrepresentation threshold (%%)")
+    parser.add_argument("--intersectional", action="store_true",
+                        help="also flag sparse or over-dominant Race x Age group x Gender combinations")
+    parser.add_argument("--min-cell", type=int, default=CellThresholds.min_count,
+                        help="combinations with fewer participants are sparse")
+    parser.add_argument("--positive", help="Response value counted as the positive outcome in fairness metrics "
+                                           "(default: inferred from yes/true/positive/1)")
+    parser.add_argument("--output", help="write JSONL here instead of stdout")
+    args = parser.parse_args(argv)
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    failures = 0
+    try:
+        for record in audit_directory(args.directory, args.pattern, args.recursive, args.workers,
+                                      args.summarize, Thresholds(args.over, args.under),
+                                      CellThresholds(min_count=args.min_cell) if args.intersectional else None,
+                                      args.positive):
+            failures += "error" in record
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+import argparse
+import time
+
+import pandas as pd
+
+from benchmarks.generators import synthetic_study
+from ingest import StreamingAnalysis
+from representation import analyze_intersections, analyze_representation, find_intersection_flags
+
+
+# The original per-column value_counts loop from the Analyze tab, kept for comparison
+def legacy_flags(data):
+    flags = []
+    for column in ("Race", "Age", "Gender"):
+        for group, percentage in (data[column].value_counts(normalize=True) * 100).items():
+            if percentage > 60 or percentage < 10:
+                flags.append((column, group, percentage))
+    return flags
+
+
+def best_of(func, data, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(data)
+        timings.append(time.perf_counter() - start)
+    return min(timings), len(result)
+
+
+# Intersection flags of a study read in chunks must match those of the whole study. The study is split so
+# that no chunk holds both its last Race group and its last Gender group, and the rows that have both are
+# dropped, leaving an empty cell that no single chunk covers.
+def check_streaming(data, chunk_rows):
+    race, gender = data["Race"].max(), data["Gender"].max()
+    parts = [data[data["Race"] != race], data[(data["Race"] == race) & (data["Gender"] != gender)]]
+    streaming = StreamingAnalysis()
+    for part in parts:
+        for start in range(0, len(part), chunk_rows):
+            streaming.update(part.iloc[start:start + chunk_rows])
+    streamed = find_intersection_flags(streaming.cube)
+    if streamed != analyze_intersections(pd.concat(parts)):
+        raise SystemExit(f"streamed intersection flags differ from the full analysis ({len(streamed)} flags)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the representation and intersectional engines against the legacy loop.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-legacy", action="store_true")
+    parser.add_argument("--chunk-rows", type=int, default=100_000,
+                        help="chunk size for checking streamed intersection flags against the full analysis")
+    args = parser.parse_args()
+
+    print(f"{'rows':>12} {'engine s':>10} {'ns/row':>8} {'flags':>6} {'cube s':>8} {'cells':>6} "
+          f"{'legacy s':>10} {'flags':>6}")
+    for rows in args.sizes:
+        data = synthetic_study(rows)
+        check_streaming(data, args.chunk_rows)
+        engine_time, engine_flags = best_of(analyze_representation, data, args.repeat)
+        cube_time, cell_flags = best_of(analyze_intersections, data, args.repeat)
+        legacy = "-" if args.skip_legacy else None
+        if legacy is None:
+            legacy_time, legacy_count = best_of(legacy_flags, data, args.repeat)
+            legacy = f"{legacy_time:>10.3f} {legacy_count:>6}"
+        print(f"{rows:>12} {engine_time:>10.3f} {engine_time * 1e9 / rows:>8.1f} {engine_flags:>6} {cube_time:>8.3f} "
+              f"{cell_flags:>6} {legacy}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TAB_NAMES = ["Home", "Discover", "Learn", "Analyze", "Quiz"]
+
+# Libraries each tab imports on top of streamlit
+TAB_IMPORTS = {
+    "Home": ["participation"],
+    "Discover": ["plotly.graph_objects", "scoring"],
+    "Learn": [],
+    "Analyze": ["pandas", "analysis", "cache", "dashboard", "fairness", "incremental", "ingest", "instrumentation",
+                "llm", "representation", "schema"],
+    "Quiz": [],
+}
+
+# Measures the extra import time of a tab's libraries in a fresh interpreter
+IMPORT_PROBE = """
+import importlib, json, sys, time
+sys.path.insert(0, {root!r})
+import streamlit
+start = time.perf_counter()
+for name in {modules!r}:
+    module = importlib.import_module(name)
+    # plotly.graph_objects loads its classes lazily on first attribute access
+    getattr(module, "Figure", None)
+print(json.dumps(time.perf_counter() - start))
+"""
+
+# Runs app.py under AppTest and times how long each tab takes to render, on the first run and a rerun
+RENDER_PROBE = """
+import io, json, os, sys, time
+os.chdir({root!r})
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+streamlit_import = time.perf_counter() - start
+
+timings = {{}}
+tab_names = {tab_names!r}
+
+
+class TimedTab:
+    def __init__(self, tab, name):
+        self.tab, self.name = tab, name
+
+    def __enter__(self):
+        self.entered = time.perf_counter()
+        return self.tab.__enter__()
+
+    def __exit__(self, *exc):
+        now = time.perf_counter()
+        timings.setdefault(self.name, {{"render": now - self.entered, "first_render": now - run_started}})
+        timings[self.name]["rerender"] = now - self.entered
+        return self.tab.__exit__(*exc)
+
+
+original_tabs = st.tabs
+st.tabs = lambda labels, **kwargs: [TimedTab(tab, name) for tab, name in zip(original_tabs(labels, **kwargs), tab_names)]
+
+# assets/bias.png is not in the repository; skip missing images instead of aborting the run
+original_image = st.image
+st.image = lambda image, *args, **kwargs: (
+    None if isinstance(image, str) and not os.path.exists(image) else original_image(image, *args, **kwargs))
+
+upload = {upload!r}
+if upload:
+    class Upload(io.BytesIO):
+        name = os.path.basename(upload)
+        file_id = "benchmark"
+
+        @property
+        def size(self):
+            return len(self.getvalue())
+
+    content = open(upload, "rb").read()
+    original_uploader = st.file_uploader
+    st.file_uploader = lambda label, *args, **kwargs: (
+        Upload(content) if label == "Upload Medical Study CSV" else original_uploader(label, *args, **kwargs))
+
+app = AppTest.from_file("app.py", default_timeout=600)
+run_started = time.perf_counter()
+app.run()
+total = time.perf_counter() - run_started
+
+# A second run of the same session, as after any widget interaction
+run_started = time.perf_counter()
+app.run()
+rerun = time.perf_counter() - run_started
+print(json.dumps({{"streamlit_import": streamlit_import, "first_run": total, "rerun": rerun, "tabs": timings,
+                  "exceptions": [str(error.value) for error in app.exception]}}))
+"""
+
+
+def run_probe(code):
+    env = dict(os.environ, BIAS_DETECTOR_LLM_BACKEND="stub")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure app.py cold-start import and per-tab render times.")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per measurement")
+    parser.add_argument("--upload", help="CSV to feed the Analyze tab's uploader")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    imports = {}
+    for tab, modules in TAB_IMPORTS.items():
+        samples = [run_probe(IMPORT_PROBE.format(root=ROOT, modules=modules)) for _ in range(args.repeat)]
+        imports[tab] = statistics.median(samples)
+
+    renders = [run_probe(RENDER_PROBE.format(root=ROOT, tab_names=TAB_NAMES, upload=args.upload))
+               for _ in range(args.repeat)]
+
+    def median_of(key, tab=None):
+        values = [run[key] if tab is None else run["tabs"].get(tab, {}).get(key, float("nan")) for run in renders]
+        return statistics.median(values)
+
+    results = {
+        "streamlit_import": median_of("streamlit_import"),
+        "first_run": median_of("first_run"),
+        "rerun": median_of("rerun"),
+        "tabs": {tab: {"import": imports[tab], "render": median_of("render", tab),
+                       "first_render": median_of("first_render", tab), "rerender": median_of("rerender", tab)}
+                 for tab in TAB_NAMES},
+        "exceptions": sorted({error for run in renders for error in run["exceptions"]}),
+    }
+
+    print(f"streamlit import: {results['streamlit_import']:.3f}s   first full run: {results['first_run']:.3f}s   "
+          f"rerun: {results['rerun']:.3f}s")
+    print(f"{'tab':<10} {'import s':>9} {'render s':>9} {'first render s':>15} {'rerender s':>11}")
+    for tab, timing in results["tabs"].items():
+        print(f"{tab:<10} {timing['import']:>9.3f} {timing['render']:>9.3f} {timing['first_render']:>15.3f} "
+              f"{timing['rerender']:>11.3f}")
+    for error in results["exceptions"]:
+        print(f"exception: {error}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
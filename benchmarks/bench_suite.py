@@ -0,0 +1,177 @@
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+from benchmarks.generators import study_csv, study_pdf
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_ROWS = [10_000, 100_000, 1_000_000]
+DEFAULT_PAGES = [10, 100, 500]
+
+# Larger studies only run the streaming stage, as the app would stream them
+DEFAULT_MAX_MEMORY_ROWS = 10_000_000
+
+
+# Stages run on a study already loaded in memory, each timed on its own
+def data_stages():
+    from analysis import analyze_bias
+    from dashboard import dashboard_aggregates, plot_dashboard
+    from fairness import analyze_fairness
+    from llm import build_messages
+    from representation import analyze_intersections
+    from summarizer import summarize_dataset
+
+    return {
+        "analyze_bias": analyze_bias,
+        "intersections": analyze_intersections,
+        "fairness": analyze_fairness,
+        "plot_dashboard": lambda data: plot_dashboard(dashboard_aggregates(data)),
+        "detect_bias_prompt": lambda data: build_messages(summarize_dataset(data)),
+    }
+
+
+def stream_study(path):
+    from ingest import DEFAULT_CHUNK_ROWS, StreamingAnalysis
+
+    streaming = StreamingAnalysis()
+    for chunk in pd.read_csv(path, chunksize=DEFAULT_CHUNK_ROWS):
+        streaming.update(chunk)
+    return streaming
+
+
+def analyze_paper(path):
+    import bias_model
+
+    # Start from a cold page cache so repeats measure extraction rather than cache hits
+    bias_model._page_cache.clear()
+    return bias_model.analyze_bias(path)
+
+
+# Best wall time over the repeats, then the tracemalloc peak of one more traced run.
+# Peaks cover allocations made by Python and NumPy in this process, not in worker processes.
+def measure(func, repeat, trace_memory=True):
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    peak = None
+    if trace_memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return min(timings), peak
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(rows, pages, data_dir, repeat=1, max_memory_rows=DEFAULT_MAX_MEMORY_ROWS, trace_memory=True,
+              seed=0, report=print):
+    results = []
+
+    def record(stage, scale, unit, func):
+        seconds, peak = measure(func, repeat, trace_memory)
+        results.append({"stage": stage, "scale": scale, "unit": unit, "seconds": seconds, "peak_bytes": peak})
+        report(format_result(results[-1]))
+
+    for count in rows:
+        path = study_csv(data_dir, count, seed)
+        record("stream_csv", count, "rows", lambda: stream_study(path))
+        if count > max_memory_rows:
+            continue
+        record("load_csv", count, "rows", lambda: pd.read_csv(path))
+        data = pd.read_csv(path)
+        for stage, func in data_stages().items():
+            record(stage, count, "rows", lambda func=func, data=data: func(data))
+        del data
+
+    for count in pages:
+        path = study_pdf(data_dir, count, seed)
+        record("pdf_analyze_bias", count, "pages", lambda: analyze_paper(path))
+    return results
+
+
+def format_result(result):
+    peak = "-" if result["peak_bytes"] is None else f"{result['peak_bytes'] / 2 ** 20:.1f}"
+    return (f"{result['stage']:<20} {result['scale']:>10} {result['unit']:<6} {result['seconds']:>10.3f} "
+            f"{peak:>10}")
+
+
+# Print how each stage moved against an earlier results file
+def compare(results, baseline):
+    previous = {(r["stage"], r["scale"]): r for r in baseline["results"]}
+    print(f"\ncompared with {baseline['meta'].get('commit') or 'baseline'}:")
+    print(f"{'stage':<20} {'scale':>10} {'before s':>10} {'after s':>10} {'speedup':>8} {'peak MiB':>17}")
+    for result in results:
+        before = previous.get((result["stage"], result["scale"]))
+        if before is None:
+            continue
+        speedup = before["seconds"] / result["seconds"] if result["seconds"] else float("inf")
+        peaks = "-"
+        if before["peak_bytes"] is not None and result["peak_bytes"] is not None:
+            peaks = f"{before['peak_bytes'] / 2 ** 20:.1f} -> {result['peak_bytes'] / 2 ** 20:.1f}"
+        print(f"{result['stage']:<20} {result['scale']:>10} {before['seconds']:>10.3f} {result['seconds']:>10.3f} "
+              f"{speedup:>7.2f}x {peaks:>17}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time every analysis stage on synthetic studies and papers.")
+    parser.add_argument("--rows", type=int, nargs="*", default=DEFAULT_ROWS, help="study sizes in rows")
+    parser.add_argument("--pages", type=int, nargs="*", default=DEFAULT_PAGES, help="paper sizes in pages")
+    parser.add_argument("--repeat", type=int, default=1, help="timed runs per stage (the best is kept)")
+    parser.add_argument("--max-memory-rows", type=int, default=DEFAULT_MAX_MEMORY_ROWS,
+                        help="larger studies only run the streaming stage")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced run that measures peak memory")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=os.path.join(ROOT, ".cache", "benchmarks"),
+                        help="where generated studies and papers are kept between runs")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="earlier --json output to compare against")
+    args = parser.parse_args()
+
+    print(f"{'stage':<20} {'scale':>10} {'unit':<6} {'seconds':>10} {'peak MiB':>10}")
+    results = run_suite(args.rows, args.pages, args.data_dir, args.repeat, args.max_memory_rows,
+                        not args.no_memory, args.seed)
+    output = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(output, file, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            compare(results, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
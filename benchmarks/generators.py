@@ -0,0 +1,109 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+RACES = np.array(["White", "Black", "Hispanic", "Asian", "Other"])
+RACE_SHARES = [0.62, 0.13, 0.12, 0.08, 0.05]
+GENDERS = np.array(["Male", "Female", "Other"])
+GENDER_SHARES = [0.55, 0.44, 0.01]
+RESPONSES = np.array(["No", "Yes"])
+
+# Rows generated and written at a time, so large studies never sit in memory whole
+WRITE_CHUNK_ROWS = 1_000_000
+
+# Lines of body text per synthetic PDF page
+PDF_LINES_PER_PAGE = 40
+
+
+# Deterministic synthetic study with raw integer ages, a Response outcome that is lower for
+# Black and Hispanic participants, a model Prediction and medication times
+def synthetic_study(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    race = rng.choice(len(RACES), rows, p=RACE_SHARES)
+    response_rate = np.where(race == 1, 0.42, np.where(race == 2, 0.46, 0.52))
+    response = (rng.random(rows) < response_rate).astype(np.int64)
+    prediction = np.where(rng.random(rows) < 0.85, response, 1 - response)
+    return pd.DataFrame({
+        "Race": RACES[race],
+        "Age": rng.integers(18, 90, rows),
+        "Gender": GENDERS[rng.choice(len(GENDERS), rows, p=GENDER_SHARES)],
+        "Response": RESPONSES[response],
+        "Prediction": RESPONSES[prediction],
+        "Time taking medication": np.round(rng.gamma(2.0, 3.0, rows), 2),
+    })
+
+
+# Write a synthetic study CSV chunk by chunk; chunk i is seeded from (seed, i), so files are reproducible
+def write_study_csv(path, rows, seed=0, chunk_rows=WRITE_CHUNK_ROWS):
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        for index, start in enumerate(range(0, rows, chunk_rows)):
+            chunk = synthetic_study(min(chunk_rows, rows - start), seed=[seed, index])
+            chunk.to_csv(file, index=False, header=index == 0)
+    return path
+
+
+# Body text for one page, mixing filler with the cohort sentences a paper reports
+def _page_lines(rng, page):
+    participants = int(rng.integers(200, 20000))
+    shares = rng.dirichlet(np.ones(len(RACES)) * 2) * 100
+    lines = [f"Section {page + 1}. Study population and methods"]
+    lines.append(f"A total of {participants:,} participants were enrolled across {int(rng.integers(2, 40))} sites.")
+    lines.append("Of these, " + ", ".join(f"{share:.1f}% were {race}" for race, share in zip(RACES, shares)) + ".")
+    lines.append(f"The cohort was {rng.uniform(30, 70):.1f}% female with a median age of {int(rng.integers(30, 75))} "
+                 "years.")
+    while len(lines) < PDF_LINES_PER_PAGE:
+        lines.append("Outcomes were assessed at baseline and follow-up using standardized clinical measures.")
+    return lines
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+# Minimal single-font PDF writer: one text content stream per page, enough for PyPDF2 to extract
+def write_study_pdf(path, pages, seed=0):
+    rng = np.random.default_rng(seed)
+    objects = {1: b"<< /Type /Catalog /Pages 2 0 R >>", 3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"}
+    kids = []
+    for page in range(pages):
+        page_id, content_id = 4 + 2 * page, 5 + 2 * page
+        commands = ["BT /F1 9 Tf 11 TL 40 800 Td"] + [f"({_escape(line)}) Tj T*" for line in _page_lines(rng, page)]
+        stream = "\n".join(commands + ["ET"]).encode("latin-1")
+        objects[page_id] = (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] /Contents {content_id} 0 R "
+                            f"/Resources << /Font << /F1 3 0 R >> >> >>").encode()
+        objects[content_id] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        kids.append(f"{page_id} 0 R")
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>".encode()
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(output)
+        output += b"%d 0 obj\n%s\nendobj\n" % (number, objects[number])
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offsets[number] for number in sorted(objects))
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as file:
+        file.write(output)
+    return path
+
+
+# Generated files are kept in data_dir and reused across runs with the same scale and seed.
+# Files are written under a temporary name first so an interrupted run never leaves a truncated one behind.
+def _cached_file(data_dir, name, write, *args):
+    path = os.path.join(data_dir, name)
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        write(path + ".tmp", *args)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def study_csv(data_dir, rows, seed=0):
+    return _cached_file(data_dir, f"study_{rows}_{seed}.csv", write_study_csv, rows, seed)
+
+
+def study_pdf(data_dir, pages, seed=0):
+    return _cached_file(data_dir, f"paper_{pages}_{seed}.pdf", write_study_pdf, pages, seed)
@@ -0,0 +1,346 @@
+import atexit
+import hashlib
+import io
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import pandas as pd
+
+# Default memory budget for cached results
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Bytes hashed per update when fingerprinting a file
+FINGERPRINT_BLOCK_BYTES = 8 * 1024 * 1024
+
+# Bump whenever an analysis changes its output so shared results computed by older code are not reused
+ANALYSIS_VERSION = "3"
+
+# Where results shared between sessions and worker processes are kept, and its default limits
+DEFAULT_SHARED_DIR = os.path.join(".cache", "results")
+DEFAULT_SHARED_MAX_BYTES = 2 * 1024 * 1024 * 1024
+DEFAULT_SHARED_TTL_SECONDS = 7 * 24 * 60 * 60
+
+# Eviction frees space down to this fraction of the size limit, so it does not run on every write
+EVICTION_LOW_WATER = 0.9
+
+# Seconds a writer waits for another process to release the index
+SQLITE_BUSY_TIMEOUT = 30
+
+# Seconds hit and miss counts and access times are gathered in memory before a read writes them to the index;
+# writes and stats() write them sooner
+ACCESS_FLUSH_SECONDS = 30
+
+FRAME = "parquet"
+OBJECT = "pickle"
+
+
+# Content hash of an uploaded file (or any bytes-like / file-like object)
+def fingerprint(content):
+    digest = hashlib.blake2b(digest_size=20)
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        digest.update(content)
+    else:
+        content.seek(0)
+        for block in iter(lambda: content.read(FINGERPRINT_BLOCK_BYTES), b""):
+            digest.update(block)
+        content.seek(0)
+    return digest.hexdigest()
+
+
+# DataFrames are stored as Parquet, everything else (and frames Parquet can't hold) is pickled
+def encode(value):
+    if isinstance(value, pd.DataFrame):
+        buffer = io.BytesIO()
+        try:
+            value.to_parquet(buffer, index=True)
+            return FRAME, buffer.getvalue()
+        except (ValueError, TypeError):
+            pass
+    return OBJECT, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def decode(kind, payload):
+    if kind == FRAME:
+        return pd.read_parquet(io.BytesIO(payload))
+    return pickle.loads(payload)
+
+
+# Encoded results shared by every session and worker process of a deployment: an SQLite index (in WAL mode,
+# so readers never block the writer) of blob files holding the payloads. The directory is bounded by
+# max_bytes with least-recently-used eviction, and entries older than ttl_seconds are dropped. Hit, miss,
+# write and eviction counts are kept in the index, so stats() covers the whole deployment. Lookups only
+# read; their bookkeeping is written in batches, so access times used for eviction may lag a little.
+class SharedCache:
+    def __init__(self, directory=None, max_bytes=DEFAULT_SHARED_MAX_BYTES, ttl_seconds=DEFAULT_SHARED_TTL_SECONDS):
+        self.directory = directory or DEFAULT_SHARED_DIR
+        self.blob_directory = os.path.join(self.directory, "blobs")
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        # Read bookkeeping not yet written to the index: hit and miss counts, (last access, hits) per key and
+        # the creation time of expired or missing entries to drop
+        self._pending_lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._accessed = {}
+        self._stale = {}
+        self._flushed = time.monotonic()
+        atexit.register(self.flush)
+        os.makedirs(self.blob_directory, exist_ok=True)
+        with self._transaction() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, kind TEXT NOT NULL, "
+                               "size INTEGER NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL, "
+                               "hits INTEGER NOT NULL DEFAULT 0)")
+            connection.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            connection.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    # Configured by BIAS_DETECTOR_RESULT_CACHE_DIR, _BYTES and _TTL; returns None when the directory is "off"
+    @classmethod
+    def from_environment(cls):
+        directory = os.getenv("BIAS_DETECTOR_RESULT_CACHE_DIR") or DEFAULT_SHARED_DIR
+        if directory.lower() in ("off", "0", "none"):
+            return None
+        return cls(directory,
+                   max_bytes=int(os.getenv("BIAS_DETECTOR_RESULT_CACHE_BYTES") or DEFAULT_SHARED_MAX_BYTES),
+                   ttl_seconds=float(os.getenv("BIAS_DETECTOR_RESULT_CACHE_TTL") or DEFAULT_SHARED_TTL_SECONDS))
+
+    # One connection per thread; sqlite3 connections can't be shared between threads
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(os.path.join(self.directory, "index.sqlite"), timeout=SQLITE_BUSY_TIMEOUT,
+                                         isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    # Write transaction that takes the index lock up front, so concurrent writers queue instead of deadlocking
+    @contextmanager
+    def _transaction(self):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def _blob_path(self, key):
+        name = hashlib.blake2b(key.encode(), digest_size=20).hexdigest()
+        return os.path.join(self.blob_directory, name[:2], name)
+
+    def _count(self, connection, name, amount=1):
+        connection.execute("INSERT INTO counters (name, value) VALUES (?, ?) "
+                           "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value", (name, amount))
+
+    def _remove_blobs(self, keys):
+        for key in keys:
+            try:
+                os.remove(self._blob_path(key))
+            except OSError:
+                pass
+
+    # (kind, payload) stored under key, or None on a miss or an expired entry. Takes no write lock: the lookup
+    # is recorded in memory and written with the next batch.
+    def get(self, key):
+        now = time.time()
+        row = self._connection().execute("SELECT kind, created FROM entries WHERE key = ?", (key,)).fetchone()
+        payload = None
+        if row is not None and now - row[1] <= self.ttl_seconds:
+            try:
+                with open(self._blob_path(key), "rb") as file:
+                    payload = file.read()
+            except OSError:
+                # Evicted by another process between the lookup and the read
+                payload = None
+        with self._pending_lock:
+            if payload is None:
+                self._misses += 1
+                if row is not None:
+                    self._stale[key] = row[1]
+            else:
+                self._hits += 1
+                self._accessed[key] = (now, self._accessed.get(key, (0, 0))[1] + 1)
+            due = time.monotonic() - self._flushed >= ACCESS_FLUSH_SECONDS
+        if due:
+            self.flush()
+        if payload is None:
+            return None
+        return row[0], payload
+
+    # Whether a live entry is stored under key, without reading its payload or counting a lookup
+    def contains(self, key):
+        row = self._connection().execute("SELECT 1 FROM entries WHERE key = ? AND created >= ? LIMIT 1",
+                                         (key, time.time() - self.ttl_seconds)).fetchone()
+        return row is not None
+
+    # Write the lookups recorded since the last flush. Best effort: if the index stays locked past the busy
+    # timeout, the bookkeeping is dropped rather than failing the read that triggered it.
+    def flush(self):
+        if not (self._hits or self._misses or self._stale):
+            return
+        try:
+            with self._transaction() as connection:
+                self._write_pending(connection)
+        except sqlite3.OperationalError:
+            pass
+
+    def _write_pending(self, connection):
+        with self._pending_lock:
+            hits, misses, accessed, stale = self._hits, self._misses, self._accessed, self._stale
+            self._hits, self._misses, self._accessed, self._stale = 0, 0, {}, {}
+            self._flushed = time.monotonic()
+        if hits:
+            self._count(connection, "hits", hits)
+        if misses:
+            self._count(connection, "misses", misses)
+        connection.executemany("UPDATE entries SET accessed = MAX(accessed, ?), hits = hits + ? WHERE key = ?",
+                               [(last, count, key) for key, (last, count) in accessed.items()])
+        connection.executemany("DELETE FROM entries WHERE key = ? AND created = ?", list(stale.items()))
+
+    def put(self, key, kind, payload):
+        if len(payload) > self.max_bytes:
+            return
+        path = self._blob_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so readers never see a partial payload
+        handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(handle, "wb") as file:
+            file.write(payload)
+        os.replace(temporary, path)
+        now = time.time()
+        with self._transaction() as connection:
+            # Pending access times go in first so eviction sees them
+            self._write_pending(connection)
+            connection.execute("INSERT OR REPLACE INTO entries (key, kind, size, created, accessed) "
+                               "VALUES (?, ?, ?, ?, ?)", (key, kind, len(payload), now, now))
+            self._count(connection, "writes")
+            removed = self._evict(connection, now)
+        self._remove_blobs(removed)
+
+    # Drop expired entries, then the least recently used ones until the total is under the low-water mark.
+    # Returns the evicted keys; their blobs are removed once the transaction has committed.
+    def _evict(self, connection, now):
+        removed = [key for key, in connection.execute("SELECT key FROM entries WHERE created < ?",
+                                                       (now - self.ttl_seconds,))]
+        if removed:
+            connection.execute("DELETE FROM entries WHERE created < ?", (now - self.ttl_seconds,))
+            self._count(connection, "expirations", len(removed))
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total > self.max_bytes:
+            evicted = []
+            target = total - self.max_bytes * EVICTION_LOW_WATER
+            for key, size in connection.execute("SELECT key, size FROM entries ORDER BY accessed"):
+                if target <= 0:
+                    break
+                evicted.append(key)
+                target -= size
+            connection.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in evicted])
+            self._count(connection, "evictions", len(evicted))
+            removed += evicted
+        return removed
+
+    def stats(self):
+        self.flush()
+        connection = self._connection()
+        stats = {name: 0 for name in ("hits", "misses", "writes", "evictions", "expirations")}
+        stats.update(connection.execute("SELECT name, value FROM counters").fetchall())
+        stats["entries"], stats["bytes"] = connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._transaction() as connection:
+            self._write_pending(connection)
+            removed = [key for key, in connection.execute("SELECT key FROM entries")]
+            connection.execute("DELETE FROM entries")
+            connection.execute("DELETE FROM counters")
+        self._remove_blobs(removed)
+
+
+# Size-bounded LRU cache of analysis results keyed by (content fingerprint, result name). With a SharedCache
+# behind it, results are also written through to (and looked up in) the deployment-wide store, keyed by the
+# fingerprint and ANALYSIS_VERSION, so a study another session already analyzed is not recomputed.
+class ResultCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, shared=None):
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self.total_bytes = 0
+        self.entries = OrderedDict()
+        # Keys already missed in the shared store, so reruns don't ask it again until they are put
+        self.shared_misses = set()
+
+    def shared_key(self, fingerprint_key, name):
+        return f"{ANALYSIS_VERSION}:{fingerprint_key}:{name}"
+
+    # (kind, payload) from this cache, or from the shared store on a local miss (kept locally afterwards)
+    def _lookup(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        if self.shared is None or key in self.shared_misses:
+            return None
+        entry = self.shared.get(self.shared_key(*key))
+        if entry is None:
+            self.shared_misses.add(key)
+        else:
+            self._store(key, *entry)
+        return entry
+
+    # Checks the shared store's index without fetching the payload
+    def contains(self, fingerprint_key, name):
+        key = (fingerprint_key, name)
+        if key in self.entries:
+            return True
+        if self.shared is None or key in self.shared_misses:
+            return False
+        if self.shared.contains(self.shared_key(*key)):
+            return True
+        self.shared_misses.add(key)
+        return False
+
+    def get(self, fingerprint_key, name, default=None):
+        entry = self._lookup((fingerprint_key, name))
+        if entry is None:
+            return default
+        return decode(*entry)
+
+    def put(self, fingerprint_key, name, value):
+        kind, payload = encode(value)
+        self._store((fingerprint_key, name), kind, payload)
+        if self.shared is not None:
+            self.shared_misses.discard((fingerprint_key, name))
+            self.shared.put(self.shared_key(fingerprint_key, name), kind, payload)
+        return value
+
+    def _store(self, key, kind, payload):
+        self.discard(key)
+        if len(payload) > self.max_bytes:
+            return
+        self.entries[key] = (kind, payload)
+        self.total_bytes += len(payload)
+        while self.total_bytes > self.max_bytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.total_bytes -= len(evicted)
+
+    def discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= len(entry[1])
+
+    # Return the cached result, computing and storing it on a miss
+    def get_or_compute(self, fingerprint_key, name, compute):
+        entry = self._lookup((fingerprint_key, name))
+        if entry is not None:
+            return decode(*entry)
+        return self.put(fingerprint_key, name, compute())
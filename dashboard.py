@@ -0,0 +1,230 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from representation import DEFAULT_AGE_BINS, age_band_labels, encode_column
+
+MEDICATION_COLUMN = "Time taking medication"
+
+# Quantiles kept per (age band, gender) group for the box plot
+QUANTILES = (0.0, 0.25, 0.5, 0.75, 1.0)
+QUANTILE_NAMES = ("min", "q1", "median", "q3", "max")
+
+# Relative accuracy of the medication-time quantile sketch
+SKETCH_ACCURACY = 0.01
+_SKETCH_GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+
+# Sampled points drawn over each box of the medication box plot
+POINTS_PER_BOX = 200
+
+# Sketch buckets of positive values are offset by this (negatives mirror them) so keys sort in value order
+_SKETCH_OFFSET = 1 << 32
+
+
+# Age bands (or the raw values when Age is not numeric) as a categorical column
+def age_groups(data, age_bins=DEFAULT_AGE_BINS):
+    codes, labels = encode_column(data["Age"], "Age", age_bins)
+    return pd.Categorical.from_codes(codes, categories=labels)
+
+
+# Mergeable counts behind the pie and bar charts, from a single groupby over Gender x Age x Response
+def dashboard_counts(data, age_bins=DEFAULT_AGE_BINS):
+    keys = {}
+    if "Gender" in data.columns:
+        keys["Gender"] = data["Gender"]
+    if "Age" in data.columns:
+        keys["Age"] = age_groups(data, age_bins)
+    if "Response" in data.columns and "Gender" in keys:
+        keys["Response"] = data["Response"]
+    if not keys:
+        return {}
+
+    sizes = pd.DataFrame(keys).groupby(list(keys), observed=True).size()
+    counts = {}
+    if "Gender" in keys:
+        counts["gender"] = sizes.groupby(level="Gender", observed=True).sum()
+    if "Age" in keys:
+        counts["age"] = sizes.groupby(level="Age", observed=True).sum()
+        # Plain labels (in band order) so counts from different chunks can be merged
+        counts["age"].index = counts["age"].index.astype(str)
+    if "Response" in keys:
+        counts["response_by_gender"] = sizes.groupby(level=["Gender", "Response"], observed=True).sum()
+    return counts
+
+
+# Medication-time quantiles for every (age band, gender) group in one groupby
+def medication_quantiles(data, age_bins=DEFAULT_AGE_BINS):
+    if not {"Age", "Gender", MEDICATION_COLUMN}.issubset(data.columns):
+        return None
+    frame = pd.DataFrame({
+        "Age": age_groups(data, age_bins),
+        "Gender": data["Gender"],
+        MEDICATION_COLUMN: pd.to_numeric(data[MEDICATION_COLUMN], errors="coerce"),
+    })
+    grouped = frame.groupby(["Age", "Gender"], observed=True)[MEDICATION_COLUMN]
+    quantiles = grouped.quantile(list(QUANTILES)).unstack()
+    quantiles.columns = list(QUANTILE_NAMES)
+    return quantiles.dropna()
+
+
+# Mergeable medication-time quantile sketch: counts per (age band, gender, log-spaced bucket), in the
+# style of DDSketch. Bucket i covers (gamma^(i-1), gamma^i], so any quantile read back from the counts is
+# within SKETCH_ACCURACY of the true value. Sketches of separate chunks add up with merge_counts.
+def medication_sketch(data, age_bins=DEFAULT_AGE_BINS):
+    if not {"Age", "Gender", MEDICATION_COLUMN}.issubset(data.columns):
+        return None
+    values = pd.to_numeric(data[MEDICATION_COLUMN], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    buckets = np.zeros(len(values), dtype=np.int64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        magnitude = np.ceil(np.log(np.abs(values)) / np.log(_SKETCH_GAMMA))
+    nonzero = np.isfinite(magnitude)
+    buckets[nonzero] = (np.sign(values[nonzero]) * (_SKETCH_OFFSET + magnitude[nonzero])).astype(np.int64)
+    frame = pd.DataFrame({"Age": age_groups(data, age_bins), "Gender": data["Gender"], "bucket": buckets})
+    sizes = frame[~np.isnan(values)].groupby(["Age", "Gender", "bucket"], observed=True).size()
+    # Plain labels so sketches from different chunks can be merged
+    return sizes.set_axis(sizes.index.set_levels([level.astype(str) for level in sizes.index.levels[:2]],
+                                                 level=[0, 1]))
+
+
+# Value represented by each sketch bucket
+def _bucket_values(buckets):
+    magnitude = np.abs(buckets) - _SKETCH_OFFSET
+    return np.where(buckets == 0, 0.0, np.sign(buckets) * 2 * _SKETCH_GAMMA ** magnitude / (_SKETCH_GAMMA + 1))
+
+
+# Medication quantiles per (age band, gender) read back from a sketch, in the layout of medication_quantiles
+def sketch_quantiles(sketch, age_bins=DEFAULT_AGE_BINS):
+    if sketch is None or sketch.empty:
+        return None
+    rows = {}
+    for (age, gender), group in sketch.groupby(level=["Age", "Gender"], sort=False):
+        group = group.sort_index(level="bucket")
+        cumulative = np.cumsum(group.to_numpy())
+        ranks = np.asarray(QUANTILES) * (cumulative[-1] - 1)
+        positions = np.searchsorted(cumulative, ranks, side="right")
+        rows[(age, gender)] = _bucket_values(group.index.get_level_values("bucket").to_numpy()[positions])
+    quantiles = pd.DataFrame.from_dict(rows, orient="index", columns=list(QUANTILE_NAMES))
+    quantiles.index = pd.MultiIndex.from_tuples(quantiles.index, names=["Age", "Gender"])
+    # Age bands in band order, then genders alphabetically, as the groupby in medication_quantiles gives
+    band_order = {label: position for position, label in enumerate(age_band_labels(age_bins))}
+    return quantiles.sort_index(key=lambda level: level.map(band_order) if level.name == "Age" else level)
+
+
+# Medication times of up to per_group sampled rows of every (age band, gender) group, for the points drawn over
+# the box plot. Taken from a stratified sample, so small groups still get their points.
+def medication_points(sample, age_bins=DEFAULT_AGE_BINS, per_group=POINTS_PER_BOX):
+    if sample is None or not {"Age", "Gender", MEDICATION_COLUMN}.issubset(sample.columns):
+        return None
+    frame = pd.DataFrame({
+        "Age": np.asarray(age_groups(sample, age_bins).astype(str)),
+        "Gender": sample["Gender"].astype(str).to_numpy(),
+        MEDICATION_COLUMN: pd.to_numeric(sample[MEDICATION_COLUMN], errors="coerce").to_numpy(),
+    }).dropna()
+    points = frame.groupby(["Age", "Gender"], sort=False).head(per_group)
+    return points.set_index(["Age", "Gender"])[MEDICATION_COLUMN]
+
+
+# Everything plot_dashboard needs; its size depends on the number of groups, not rows.
+# Points for the box plot come from `sample` (e.g. StreamingAnalysis.sample) when one is given.
+def dashboard_aggregates(data, age_bins=DEFAULT_AGE_BINS, sample=None):
+    aggregates = dashboard_counts(data, age_bins)
+    aggregates["medication"] = medication_quantiles(data, age_bins)
+    aggregates["medication_points"] = medication_points(sample, age_bins)
+    return aggregates
+
+
+# Box plot statistics with whiskers at 1.5 IQR clipped to the observed range (outliers aren't drawn)
+def box_stats(quantiles):
+    stats = []
+    for (age, gender), row in quantiles.iterrows():
+        iqr = row["q3"] - row["q1"]
+        stats.append({
+            "label": f"{age}\n{gender}",
+            "med": row["median"],
+            "q1": row["q1"],
+            "q3": row["q3"],
+            "whislo": max(row["min"], row["q1"] - 1.5 * iqr),
+            "whishi": min(row["max"], row["q3"] + 1.5 * iqr),
+            "fliers": [],
+        })
+    return stats
+
+
+# Dashboard plots for analysis, drawn from precomputed aggregates and returned as PNG bytes
+def plot_dashboard(aggregates):
+    from matplotlib import colormaps
+    from matplotlib.figure import Figure
+
+    # A standalone Figure avoids pyplot's global state, which isn't safe across session threads
+    fig = Figure(figsize=(14, 10))
+    axs = fig.subplots(2, 2)
+    fig.patch.set_facecolor('black')
+
+    # Gender Distribution (Pie chart)
+    gender_distribution_data = aggregates.get('gender')
+    if gender_distribution_data is not None:
+        axs[0, 0].pie(gender_distribution_data, labels=gender_distribution_data.index, autopct='%1.1f%%',
+                      colors=['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728'], textprops={'color': 'white'})
+    axs[0, 0].set_title('Gender Distribution', color='white')
+    axs[0, 0].set_facecolor('black')
+
+    # Age Group Distribution (Bar chart)
+    age_distribution_data = aggregates.get('age')
+    if age_distribution_data is not None:
+        colors = colormaps['Set2'](np.arange(len(age_distribution_data)) % 8)
+        axs[0, 1].bar(age_distribution_data.index.astype(str), age_distribution_data.to_numpy(), color=colors)
+    axs[0, 1].set_title('Age Group Distribution', color='white')
+    axs[0, 1].set_xlabel('Age Group', color='white')
+    axs[0, 1].set_ylabel('Count', color='white')
+    axs[0, 1].set_facecolor('black')
+
+    # Response Rate by Gender (Grouped bar chart)
+    response_by_gender = aggregates.get('response_by_gender')
+    if response_by_gender is not None:
+        table = response_by_gender.unstack(fill_value=0)
+        positions = np.arange(len(table.index))
+        width = 0.8 / max(len(table.columns), 1)
+        colors = colormaps['coolwarm'](np.linspace(0, 1, max(len(table.columns), 2)))
+        for offset, response in enumerate(table.columns):
+            axs[1, 0].bar(positions + offset * width - 0.4 + width / 2, table[response].to_numpy(), width,
+                          label=str(response), color=colors[offset])
+        axs[1, 0].set_xticks(positions, table.index.astype(str))
+        axs[1, 0].legend(title='Response')
+    axs[1, 0].set_title('Response Rate by Gender', color='white')
+    axs[1, 0].set_ylabel('Count', color='white')
+    axs[1, 0].set_facecolor('black')
+
+    # Time on Medication by Age Group (Box plot)
+    medication = aggregates.get('medication')
+    if medication is not None and not medication.empty:
+        boxes = axs[1, 1].bxp(box_stats(medication), showfliers=False, patch_artist=True,
+                              whiskerprops={'color': 'white'}, capprops={'color': 'white'})
+        genders = list(medication.index.get_level_values('Gender').unique())
+        palette = colormaps['Pastel1'](np.arange(len(genders)) % 9)
+        for box, gender in zip(boxes['boxes'], medication.index.get_level_values('Gender')):
+            box.set_facecolor(palette[genders.index(gender)])
+        # Sampled rows as jittered points over their box
+        points = aggregates.get('medication_points')
+        if points is not None and not points.empty:
+            positions = {(str(age), str(gender)): position
+                         for position, (age, gender) in enumerate(medication.index, start=1)}
+            x = points.index.map(lambda group: positions.get(group, np.nan)).to_numpy(dtype=np.float64)
+            jitter = np.random.default_rng(0).uniform(-0.2, 0.2, len(x))
+            axs[1, 1].scatter(x + jitter, points.to_numpy(), s=4, color='white', alpha=0.35, linewidths=0,
+                              zorder=3)
+        axs[1, 1].tick_params(axis='x', labelsize=8)
+    axs[1, 1].set_title('Time on Medication by Age Group', color='white')
+    axs[1, 1].set_ylabel('Years on Medication', color='white')
+    axs[1, 1].set_facecolor('black')
+
+    for ax in axs.flat:
+        ax.tick_params(colors='white')
+
+    # Adjust layout
+    fig.tight_layout()
+
+    # Rasterize once so the image can be cached and re-shown without re-plotting
+    image = io.BytesIO()
+    fig.savefig(image, format='png', bbox_inches='tight', facecolor=fig.get_facecolor())
+    return image.getvalue()
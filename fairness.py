@@ -0,0 +1,251 @@
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from representation import DEFAULT_AGE_BINS, DEMOGRAPHIC_COLUMNS, encode_column
+
+# Outcome column the metrics are computed on
+OUTCOME_COLUMN = "Response"
+
+# Columns holding a model's predicted outcome, checked in this order
+PREDICTION_COLUMNS = ("Prediction", "Predicted Response", "Predicted")
+
+# Values read as the positive outcome (compared case-insensitively), checked in this order
+POSITIVE_VALUES = ("yes", "true", "positive", "1", "y")
+
+DEFAULT_REPLICATES = 2000
+DEFAULT_CONFIDENCE = 0.95
+
+# Bootstrap replicates drawn per multinomial call; bounds memory at this many copies of the cell counts
+BOOTSTRAP_BATCH = 10_000
+
+# Display names of the metrics, in report order
+METRIC_NAMES = {
+    "demographic_parity_difference": "Demographic parity difference",
+    "disparate_impact_ratio": "Disparate impact ratio",
+    "true_positive_rate_gap": "True positive rate gap",
+    "false_positive_rate_gap": "False positive rate gap",
+    "equalized_odds_difference": "Equalized odds difference",
+}
+
+
+# A fairness metric with its bootstrap confidence interval
+@dataclass(frozen=True)
+class MetricEstimate:
+    name: str
+    value: float
+    low: float
+    high: float
+
+
+# The prediction column of the study, if it has one
+def prediction_column(columns):
+    return next((column for column in PREDICTION_COLUMNS if column in columns), None)
+
+
+# Compare outcome values as lower-case strings, treating 1 and 1.0 (from chunks with missing values) alike
+def _normalize(value):
+    text = str(value).strip().lower()
+    if text.endswith(".0") and text[:-2].lstrip("-").isdigit():
+        text = text[:-2]
+    return text
+
+
+# Normalized positive value among an outcome's distinct values. A `positive` value asked for by the caller is
+# checked against them (ValueError when it is missing); otherwise it is inferred from POSITIVE_VALUES or as the
+# larger of two numbers. Returns None when it can't be inferred, including when only one value occurs.
+def positive_value(values, positive=None):
+    normalized = {_normalize(value) for value in values}
+    if positive is not None:
+        positive = _normalize(positive)
+        if positive not in normalized:
+            raise ValueError(f"{positive!r} is not an outcome value; found: {', '.join(sorted(normalized))}")
+        return positive
+    if len(normalized) < 2:
+        return None
+    for candidate in POSITIVE_VALUES:
+        if candidate in normalized:
+            return candidate
+    numeric = pd.to_numeric(pd.Series(sorted(normalized)), errors="coerce")
+    if len(normalized) == 2 and numeric.notna().all():
+        return _normalize(numeric.max())
+    return None
+
+
+# Distinct outcome values across outcome tables, as strings in order of first appearance
+def outcome_values(tables):
+    values = {}
+    for table in tables.values():
+        for value in table.index.remove_unused_levels().levels[1]:
+            values.setdefault(str(value))
+    return list(values)
+
+
+# Participants per (group, outcome, prediction) for one demographic column, as a Series of non-zero counts.
+# Rows missing any of the columns are left out. Tables from separate chunks add up with merge_counts.
+def outcome_table(data, column, outcome=OUTCOME_COLUMN, prediction=None, age_bins=DEFAULT_AGE_BINS):
+    group_codes, groups = encode_column(data[column], column, age_bins)
+    codes, labels = [group_codes], [groups]
+    for name in (outcome, prediction) if prediction else (outcome,):
+        value_codes, values = pd.factorize(data[name])
+        codes.append(value_codes)
+        labels.append(pd.Index(values).astype(str))
+    complete = np.logical_and.reduce([c >= 0 for c in codes])
+    dims = tuple(len(level) for level in labels)
+    joint = np.ravel_multi_index([c[complete] for c in codes], dims)
+    counts = np.bincount(joint, minlength=int(np.prod(dims)))
+    cells = np.flatnonzero(counts)
+    index = pd.MultiIndex(levels=labels, codes=list(np.unravel_index(cells, dims)),
+                          names=[column, outcome] + ([prediction] if prediction else []))
+    return pd.Series(counts[cells], index=index, name="count", dtype=np.int64)
+
+
+# Outcome tables for every demographic column present; empty when the study has no outcome column
+def outcome_tables(data, columns=DEMOGRAPHIC_COLUMNS, outcome=OUTCOME_COLUMN, age_bins=DEFAULT_AGE_BINS):
+    if outcome not in data.columns:
+        return {}
+    prediction = prediction_column(data.columns)
+    return {column: outcome_table(data, column, outcome, prediction, age_bins)
+            for column in columns if column in data.columns}
+
+
+# Dense counts shaped (group, outcome negative/positive, prediction negative/positive) from an outcome table.
+# Without a prediction column the last axis has length one. `positive` is the normalized positive outcome.
+def cell_counts(table, positive):
+    index = table.index.remove_unused_levels()
+    groups = index.levels[0]
+    binary = []
+    for level in range(1, index.nlevels):
+        is_positive = np.array([_normalize(value) == positive for value in index.levels[level]])
+        if level == 2 and not is_positive.any():
+            is_positive = np.array([_normalize(value) == positive_value(index.levels[2])
+                                    for value in index.levels[2]])
+        binary.append(is_positive[index.codes[level]].astype(np.int64))
+    predictions = 2 if index.nlevels == 3 else 1
+    cells = index.codes[0] * 2 * predictions + binary[0] * predictions + (binary[1] if predictions == 2 else 0)
+    counts = np.bincount(cells, weights=table.to_numpy(), minlength=len(groups) * 2 * predictions)
+    return groups, counts.astype(np.int64).reshape(len(groups), 2, predictions)
+
+
+# Outcome rates and fairness metrics from cell counts with any number of leading replicate axes
+def group_metrics(counts):
+    with np.errstate(divide="ignore", invalid="ignore"), warnings.catch_warnings():
+        # Groups missing from a replicate give NaN rates, and are left out of the gaps
+        warnings.simplefilter("ignore", RuntimeWarning)
+        rates = counts[..., 1, :].sum(axis=-1) / counts.sum(axis=(-2, -1))
+        highest, lowest = np.nanmax(rates, axis=-1), np.nanmin(rates, axis=-1)
+        metrics = {
+            "rate": rates,
+            "demographic_parity_difference": highest - lowest,
+            "disparate_impact_ratio": lowest / highest,
+        }
+        if counts.shape[-1] == 2:
+            true_positive = counts[..., 1, 1] / counts[..., 1, :].sum(axis=-1)
+            false_positive = counts[..., 0, 1] / counts[..., 0, :].sum(axis=-1)
+            metrics["true_positive_rate"] = true_positive
+            metrics["false_positive_rate"] = false_positive
+            metrics["true_positive_rate_gap"] = np.nanmax(true_positive, axis=-1) - np.nanmin(true_positive, axis=-1)
+            metrics["false_positive_rate_gap"] = (np.nanmax(false_positive, axis=-1)
+                                                  - np.nanmin(false_positive, axis=-1))
+            metrics["equalized_odds_difference"] = np.fmax(metrics["true_positive_rate_gap"],
+                                                           metrics["false_positive_rate_gap"])
+    return metrics
+
+
+# Bootstrap replicates of group_metrics. Resampling rows with replacement is the same as drawing the
+# cell counts from a multinomial over the observed cell shares, so each replicate costs O(cells), not O(rows).
+def _bootstrap_batch(counts, replicates, seed):
+    rng = np.random.default_rng(seed)
+    total = int(counts.sum())
+    shares = counts.ravel() / total
+    batches = []
+    for start in range(0, replicates, BOOTSTRAP_BATCH):
+        size = min(BOOTSTRAP_BATCH, replicates - start)
+        draws = rng.multinomial(total, shares, size=size).reshape((size,) + counts.shape)
+        batches.append(group_metrics(draws))
+    return {name: np.concatenate([batch[name] for batch in batches]) for name in batches[0]}
+
+
+# Bootstrap replicates, optionally split across worker processes with independent seed streams.
+# The replicates depend on the number of workers as well as the seed.
+def bootstrap_metrics(counts, replicates=DEFAULT_REPLICATES, seed=0, workers=None):
+    seed_sequence = np.random.SeedSequence(seed)
+    if not workers or workers == 1 or replicates < 2 * BOOTSTRAP_BATCH:
+        return _bootstrap_batch(counts, replicates, seed_sequence)
+    sizes = [len(part) for part in np.array_split(np.arange(replicates), workers)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = list(pool.map(_bootstrap_batch, [counts] * workers, sizes, seed_sequence.spawn(workers)))
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+
+# Per-group outcome rates and fairness metrics for one demographic column, with percentile intervals
+def fairness_metrics(table, positive, replicates=DEFAULT_REPLICATES, confidence=DEFAULT_CONFIDENCE, seed=0,
+                     workers=None):
+    groups, counts = cell_counts(table, positive)
+    estimates = group_metrics(counts)
+    replicate_metrics = bootstrap_metrics(counts, replicates, seed, workers)
+    tails = [(1 - confidence) / 2 * 100, (1 + confidence) / 2 * 100]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        intervals = {name: np.nanpercentile(values, tails, axis=0) for name, values in replicate_metrics.items()}
+
+    group_table = pd.DataFrame({"Participants": counts.sum(axis=(1, 2))}, index=groups.rename("Group"))
+    for name, label in (("rate", "Outcome rate"), ("true_positive_rate", "True positive rate"),
+                        ("false_positive_rate", "False positive rate")):
+        if name in estimates:
+            group_table[label] = estimates[name]
+            group_table[f"{label} low"], group_table[f"{label} high"] = intervals[name]
+    metrics = [MetricEstimate(label, float(estimates[name]), float(intervals[name][0]), float(intervals[name][1]))
+               for name, label in METRIC_NAMES.items() if name in estimates]
+    return group_table, metrics
+
+
+# Fairness metrics for every demographic column with at least two groups. Empty when the positive outcome
+# can't be inferred (see positive_value); pass `positive` to choose it.
+def fairness_report(tables, replicates=DEFAULT_REPLICATES, confidence=DEFAULT_CONFIDENCE, seed=0, workers=None,
+                    positive=None):
+    values = outcome_values(tables)
+    positive = positive_value(values, positive) if values else None
+    if positive is None:
+        return {}
+    report = {}
+    for column, table in tables.items():
+        if table.index.remove_unused_levels().levels[0].size < 2:
+            continue
+        report[column] = fairness_metrics(table, positive, replicates, confidence, seed, workers)
+    return report
+
+
+# Compute the fairness report of a study in memory
+def analyze_fairness(data, columns=DEMOGRAPHIC_COLUMNS, outcome=OUTCOME_COLUMN, age_bins=DEFAULT_AGE_BINS,
+                     replicates=DEFAULT_REPLICATES, confidence=DEFAULT_CONFIDENCE, seed=0, workers=None,
+                     positive=None):
+    return fairness_report(outcome_tables(data, columns, outcome, age_bins), replicates, confidence, seed, workers,
+                           positive)
+
+
+# Outcome label shapes seen in real studies: python fairness.py checks how each is read
+if __name__ == "__main__":
+    for values, expected in ((["Yes", "No"], "yes"), ([1, 0], "1"), ([1.0, 0.0], "1"), (["3", "7"], "7"),
+                             (["TRUE", "FALSE"], "true"), (["Malignant", "Benign"], None),
+                             (["Responded", "Not responded"], None), (["Improved", "No change"], None),
+                             (["No"], None), ([0], None), (["Yes"], None)):
+        assert positive_value(values) == expected, (values, positive_value(values))
+    assert positive_value(["Malignant", "Benign"], "Malignant") == "malignant"
+    try:
+        positive_value(["Improved", "No change"], "Yes")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("a positive value missing from the outcome should raise")
+
+    study = pd.DataFrame({"Race": ["White", "Black"] * 50, "Response": ["Improved", "No change", "No change",
+                                                                        "Improved"] * 25})
+    assert analyze_fairness(study, replicates=10) == {}
+    report = analyze_fairness(study, replicates=10, positive="Improved")
+    assert report["Race"][0]["Outcome rate"].tolist() == [0.5, 0.5]
+    assert analyze_fairness(study.assign(Response="No"), replicates=10) == {}
+    print("fairness checks passed")
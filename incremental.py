@@ -0,0 +1,150 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from dataclasses import dataclass
+
+import pandas as pd
+
+from cache import FINGERPRINT_BLOCK_BYTES
+from ingest import DEFAULT_CHUNK_ROWS, StreamingAnalysis
+
+# Where per-study analysis states are saved between uploads
+DEFAULT_STATE_DIR = os.path.join(".cache", "studies")
+
+# Bump whenever StreamingAnalysis changes shape so old states are not resumed
+STATE_VERSION = "3"
+
+# Saved states kept per CSV header (i.e. per study layout); the least recently written are pruned
+STATES_PER_HEADER = 8
+
+# Longest header line looked for at the start of an upload
+MAX_HEADER_BYTES = 1024 * 1024
+
+
+# Analysis of the first `size` bytes of a study file, whose fingerprint is `digest`
+@dataclass
+class StudyState:
+    digest: str
+    size: int
+    header: bytes
+    analysis: StreamingAnalysis
+
+
+# An upload's fingerprint and size, plus the saved state of the longest earlier upload it extends (if any)
+@dataclass
+class Scan:
+    digest: str
+    size: int
+    header: bytes
+    previous: str = None
+
+
+def _header_line(file):
+    file.seek(0)
+    header = file.readline(MAX_HEADER_BYTES)
+    file.seek(0)
+    return header
+
+
+# Saved StudyStates on disk, grouped by the digest of their CSV header line so an upload is only compared
+# with earlier uploads of the same layout. File names carry the size and digest, so finding candidates
+# never unpickles anything.
+class StudyStore:
+    def __init__(self, directory=None):
+        directory = directory or os.getenv("BIAS_DETECTOR_STATE_DIR") or DEFAULT_STATE_DIR
+        self.directory = os.path.join(directory, f"v{STATE_VERSION}")
+
+    def header_directory(self, header):
+        return os.path.join(self.directory, hashlib.blake2b(header, digest_size=16).hexdigest())
+
+    # (size, digest, path) of every state saved for this header, smallest first
+    def candidates(self, header):
+        directory = self.header_directory(header)
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return []
+        found = []
+        for name in names:
+            size, _, rest = name.partition("-")
+            if rest.endswith(".pkl") and size.isdigit():
+                found.append((int(size), rest[:-len(".pkl")], os.path.join(directory, name)))
+        return sorted(found)
+
+    # Fingerprint the upload (same digest as cache.fingerprint) in one pass, checking the running digest
+    # against every saved state at that state's size along the way. A saved prefix only counts when it ends
+    # on a line boundary (or is the whole upload), since otherwise its last row may continue in this upload.
+    def scan(self, file):
+        header = _header_line(file)
+        candidates = self.candidates(header) if header else []
+        digest = hashlib.blake2b(digest_size=20)
+        position = 0
+        previous = None
+        unterminated = None
+        file.seek(0)
+        while True:
+            pending = [size for size, _, _ in candidates if size > position]
+            limit = min(pending[0] - position, FINGERPRINT_BLOCK_BYTES) if pending else FINGERPRINT_BLOCK_BYTES
+            block = file.read(limit)
+            if not block:
+                break
+            digest.update(block)
+            position += len(block)
+            for size, state_digest, path in candidates:
+                if size == position and digest.hexdigest() == state_digest:
+                    if block.endswith(b"\n"):
+                        previous = path
+                    else:
+                        unterminated = (size, path)
+        if unterminated is not None and unterminated[0] == position:
+            previous = unterminated[1]
+        file.seek(0)
+        return Scan(digest.hexdigest(), position, header, previous)
+
+    def load(self, path):
+        try:
+            with open(path, "rb") as file:
+                return pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+
+    def save(self, state):
+        directory = self.header_directory(state.header)
+        os.makedirs(directory, exist_ok=True)
+        # Write to a temporary file first so readers never see a partial state
+        handle, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(handle, "wb") as file:
+            pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, os.path.join(directory, f"{state.size}-{state.digest}.pkl"))
+        self.prune(state.header)
+
+    def prune(self, header, keep=STATES_PER_HEADER):
+        paths = sorted((path for _, _, path in self.candidates(header)), key=os.path.getmtime, reverse=True)
+        for path in paths[keep:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+# Read only the rows after the bytes a saved state already covers, yielding each chunk with the fraction of
+# the file consumed so far. The tail has no header line, so the saved column names are reused.
+def read_new_rows(file, state, total_bytes, chunk_rows=DEFAULT_CHUNK_ROWS):
+    if total_bytes <= state.size:
+        return
+    file.seek(state.size)
+    try:
+        reader = pd.read_csv(file, chunksize=chunk_rows, header=None, names=list(state.analysis.columns))
+    except pd.errors.EmptyDataError:
+        return
+    with reader:
+        for chunk in reader:
+            yield chunk, min(file.tell() / total_bytes, 1.0)
+
+
+# Resume a saved analysis with the rows an upload appended, returning the state for the whole upload
+def extend_state(file, scan, state, chunk_rows=DEFAULT_CHUNK_ROWS):
+    for chunk, _ in read_new_rows(file, state, scan.size, chunk_rows):
+        state.analysis.update(chunk)
+    return StudyState(scan.digest, scan.size, scan.header, state.analysis)
@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+from dashboard import dashboard_counts, medication_points, medication_sketch, sketch_quantiles
+from fairness import outcome_tables
+from representation import DEFAULT_AGE_BINS, MAX_JOINT_CELLS, age_band_labels, count_tables
+from sampling import DEFAULT_MIN_PER_GROUP, DEFAULT_SAMPLE_ROWS, StratifiedReservoir
+
+# Rows parsed per chunk when streaming an upload
+DEFAULT_CHUNK_ROWS = 100_000
+
+# Uploads larger than this are streamed by default
+STREAMING_THRESHOLD_BYTES = 100 * 1024 * 1024
+
+
+# Yield the CSV in bounded chunks along with the fraction of the file consumed so far
+def read_csv_chunks(file, chunk_rows=DEFAULT_CHUNK_ROWS, total_bytes=None):
+    if total_bytes is None:
+        total_bytes = getattr(file, "size", None)
+    with pd.read_csv(file, chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            progress = None
+            if total_bytes:
+                progress = min(file.tell() / total_bytes, 1.0)
+            yield chunk, progress
+
+
+# Add two count Series together, keeping integer counts and the order groups were first seen in
+def merge_counts(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    index = left.index.union(right.index, sort=False)
+    merged = left.reindex(index, fill_value=0) + right.reindex(index, fill_value=0)
+    return merged.astype(np.int64)
+
+
+# Groups of one cube level in the order count_tables lists them for a whole study: age bands in band order,
+# anything else sorted
+def _level_order(labels, column, age_bins):
+    bands = age_band_labels(age_bins) if column == "Age" and age_bins is not None else []
+    if set(labels).issubset(bands):
+        return pd.Index([band for band in bands if band in set(labels)])
+    return pd.Index(sorted(labels))
+
+
+# Add two intersection cubes. The result lists every combination of the groups either cube has seen, so a
+# combination no single chunk covers keeps its empty cell and can still be flagged as sparse. Cubes beyond
+# MAX_JOINT_CELLS stay sparse, as count_tables leaves them.
+def merge_cubes(left, right, age_bins=DEFAULT_AGE_BINS):
+    merged = merge_counts(left, right)
+    if merged is None or merged.empty:
+        return merged
+    names = merged.index.names
+    levels = [_level_order(merged.index.unique(level=level), name, age_bins) for level, name in enumerate(names)]
+    if np.prod([len(level) for level in levels], dtype=np.float64) <= MAX_JOINT_CELLS:
+        merged = merged.reindex(pd.MultiIndex.from_product(levels, names=names), fill_value=0)
+    return merged.astype(np.int64)
+
+
+# Incrementally accumulated analysis of a study read chunk by chunk.
+# Counts are exact, medication quantiles come from a mergeable sketch and row-level layers (plot points, the
+# preview and the dataset summary) come from a stratified reservoir sample that keeps every demographic group.
+# The state pickles, so reading can resume later with more rows.
+class StreamingAnalysis:
+    def __init__(self, age_bins=DEFAULT_AGE_BINS, sample_rows=DEFAULT_SAMPLE_ROWS,
+                 min_per_group=DEFAULT_MIN_PER_GROUP, seed=0):
+        self.age_bins = age_bins
+        self.sampler = StratifiedReservoir(sample_rows, min_per_group, age_bins=age_bins, seed=seed)
+        self.rows = 0
+        self.columns = None
+        self.counts = {}
+        self.cube = None
+        self.outcomes = {}
+        self.dashboard = {}
+        self.sketch = None
+        self._sample = None
+        self._preview = None
+
+    # The sample and preview are rebuilt after loading rather than saved with the state
+    def __getstate__(self):
+        return {**self.__dict__, "_sample": None, "_preview": None}
+
+    def update(self, chunk):
+        if self.columns is None:
+            self.columns = chunk.columns
+        counts, cube = count_tables(chunk, age_bins=self.age_bins)
+        for column, column_counts in counts.items():
+            self.counts[column] = merge_counts(self.counts.get(column), column_counts)
+        self.cube = merge_cubes(self.cube, cube, self.age_bins)
+        for column, table in outcome_tables(chunk, age_bins=self.age_bins).items():
+            self.outcomes[column] = merge_counts(self.outcomes.get(column), table)
+        for name, name_counts in dashboard_counts(chunk, self.age_bins).items():
+            self.dashboard[name] = merge_counts(self.dashboard.get(name), name_counts)
+        self.sketch = merge_counts(self.sketch, medication_sketch(chunk, self.age_bins))
+        self.sampler.update(chunk)
+        self.rows += len(chunk)
+        self._sample = None
+        self._preview = None
+
+    # Built from the reservoir at most once per update
+    @property
+    def sample(self):
+        if self._sample is None:
+            self._sample = self.sampler.sample()
+        return self._sample
+
+    # A few rows covering as many demographic groups as possible
+    @property
+    def preview(self):
+        if self._preview is None:
+            self._preview = self.sampler.preview()
+        return self._preview
+
+    # Exact dashboard counts plus box plot quantiles read from the sketch and points from the sample
+    def dashboard_aggregates(self):
+        aggregates = dict(self.dashboard)
+        aggregates["medication"] = sketch_quantiles(self.sketch, self.age_bins)
+        aggregates["medication_points"] = medication_points(self.sample, self.age_bins)
+        return aggregates
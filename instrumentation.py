@@ -0,0 +1,190 @@
+import json
+import os
+import resource
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+
+# Set to 1 to record spans; when unset every span is a shared no-op
+INSTRUMENTATION_ENV = "BIAS_DETECTOR_INSTRUMENTATION"
+
+# Optional JSON-lines file every finished span is appended to
+METRICS_LOG_ENV = "BIAS_DETECTOR_METRICS_LOG"
+
+# Optional Prometheus text file (node_exporter textfile collector format) rewritten after every span
+METRICS_FILE_ENV = "BIAS_DETECTOR_METRICS_FILE"
+
+# Finished spans kept in memory for the diagnostics panel
+MAX_SPANS = 500
+
+METRIC_PREFIX = "bias_detector_stage"
+
+
+# One timed stage: wall time, rows processed and the change in resident memory
+@dataclass
+class Span:
+    name: str
+    started: float
+    seconds: float = 0.0
+    rows: int = None
+    memory_delta: int = 0
+    attributes: dict = field(default_factory=dict)
+
+
+# Shared by every span while instrumentation is off; anything set on it is dropped
+class _NullSpan:
+    __slots__ = ()
+
+    @property
+    def rows(self):
+        return None
+
+    @rows.setter
+    def rows(self, value):
+        pass
+
+    @property
+    def attributes(self):
+        return {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+# Resident set size of this process; Linux reads it from /proc, elsewhere the peak RSS is the best available
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm", "rb") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class _ActiveSpan:
+    def __init__(self, recorder, span):
+        self.recorder = recorder
+        self.span = span
+
+    # rows and attributes can be filled in inside the block, once they are known
+    @property
+    def rows(self):
+        return self.span.rows
+
+    @rows.setter
+    def rows(self, value):
+        self.span.rows = value
+
+    @property
+    def attributes(self):
+        return self.span.attributes
+
+    def __enter__(self):
+        self.memory = _rss_bytes()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, error_type, error, traceback):
+        self.span.seconds = time.perf_counter() - self.start
+        self.span.memory_delta = _rss_bytes() - self.memory
+        if error_type is not None:
+            self.span.attributes["error"] = error_type.__name__
+        self.recorder.record(self.span)
+        return False
+
+
+# Process-wide recorder of stage spans. Spans can finish on any thread (e.g. the background
+# dataset summary), so the recent spans and the running totals are guarded by a lock.
+class Instrumentation:
+    def __init__(self, enabled=False, log_path=None, prometheus_path=None, max_spans=MAX_SPANS):
+        self.enabled = enabled
+        self.log_path = log_path
+        self.prometheus_path = prometheus_path
+        self.spans = deque(maxlen=max_spans)
+        self.totals = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_environment(cls):
+        return cls(enabled=os.getenv(INSTRUMENTATION_ENV, "") not in ("", "0"),
+                   log_path=os.getenv(METRICS_LOG_ENV) or None,
+                   prometheus_path=os.getenv(METRICS_FILE_ENV) or None)
+
+    def span(self, name, rows=None, **attributes):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _ActiveSpan(self, Span(name, time.time(), rows=rows, attributes=attributes))
+
+    def record(self, span):
+        with self._lock:
+            self.spans.append(span)
+            totals = self.totals.setdefault(span.name, {"calls": 0, "seconds": 0.0, "rows": 0, "errors": 0,
+                                                        "memory_delta": 0})
+            totals["calls"] += 1
+            totals["seconds"] += span.seconds
+            totals["rows"] += span.rows or 0
+            totals["errors"] += "error" in span.attributes
+            totals["memory_delta"] = span.memory_delta
+        if self.log_path:
+            line = json.dumps(asdict(span), default=str) + "\n"
+            with open(self.log_path, "a", encoding="utf-8") as file:
+                file.write(line)
+        if self.prometheus_path:
+            # Written under a per-thread temporary name first so a scraper never reads a half-written file
+            temporary = f"{self.prometheus_path}.{threading.get_ident()}.tmp"
+            with open(temporary, "w", encoding="utf-8") as file:
+                file.write(self.prometheus_text())
+            os.replace(temporary, self.prometheus_path)
+
+    def recent(self, limit=None):
+        with self._lock:
+            spans = list(self.spans)
+        return spans[-limit:] if limit else spans
+
+    def json_lines(self):
+        return "".join(json.dumps(asdict(span), default=str) + "\n" for span in self.recent())
+
+    # Running totals per stage in the Prometheus text exposition format
+    def prometheus_text(self):
+        with self._lock:
+            totals = {name: dict(values) for name, values in self.totals.items()}
+        lines = []
+        for metric, suffix, kind, description in (
+                ("calls", "_total", "counter", "Stage runs"),
+                ("seconds", "_total", "counter", "Total wall time spent in the stage"),
+                ("rows", "_total", "counter", "Rows processed by the stage"),
+                ("errors", "_total", "counter", "Stage runs that raised"),
+                ("memory_delta", "_bytes", "gauge", "Resident memory change during the last run")):
+            name = f"{METRIC_PREFIX}_{metric}{suffix}"
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for stage, values in sorted(totals.items()):
+                lines.append(f'{name}{{stage="{stage}"}} {values[metric]}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self.spans.clear()
+            self.totals.clear()
+
+
+instrumentation = Instrumentation.from_environment()
+
+
+# Time a stage with the process-wide recorder:  with span("parse_csv") as stage: ...; stage.rows = len(data)
+def span(name, rows=None, **attributes):
+    return instrumentation.span(name, rows, **attributes)
+
+
+# Wrap a zero-argument computation so it runs inside a span, e.g. for ResultCache.get_or_compute
+def traced(name, compute, rows=None, **attributes):
+    def run():
+        with span(name, rows, **attributes):
+            return compute()
+    return run
@@ -0,0 +1,209 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import SharedCache
+from instrumentation import span
+from summarizer import DEFAULT_TOKEN_BUDGET, summarize_dataset
+
+# Bump whenever the prompt wording or summary format changes so cached responses are not reused
+PROMPT_VERSION = "2"
+
+DEFAULT_MODEL = "gpt-4o"
+
+# Where cached model responses are written, how much space they may take and how long they are reused
+DEFAULT_CACHE_DIR = os.path.join(".cache", "llm_responses")
+DEFAULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_CACHE_TTL_SECONDS = 30 * 24 * 60 * 60
+
+# Per-request timeout in seconds, retries after the first attempt and the initial backoff delay
+DEFAULT_TIMEOUT = 60
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 1.0
+
+# Background threads available for model requests across all sessions
+MAX_BACKGROUND_REQUESTS = 8
+
+SYSTEM_PROMPT = "You are an expert in medical studies. Analyze this study's dataset and summarize it."
+
+USER_PROMPT = """Here is a summary of the dataset: its schema, per-column statistics, outcome rates by demographic group and a stratified sample of rows.
+```
+{summary}
+```
+For your output, write one short paragraph (maximum two sentences) of what is happening in this dataset, focusing on the results (for example, whether or not people responded to a new treatment, or whether or not a tumor is malignant or benign). Do not list the columns of the database."""
+
+
+# Chat messages sent for a dataset summary
+def build_messages(summary):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": USER_PROMPT.format(summary=summary)},
+    ]
+
+
+# Raised when a pending request is abandoned, e.g. because a new file was uploaded
+class RequestCancelled(Exception):
+    pass
+
+
+# Calls the OpenAI chat completion API
+class OpenAIBackend:
+    def __init__(self, model=DEFAULT_MODEL):
+        self.model = model
+        self.name = f"openai:{model}"
+
+    # Transient API errors worth retrying
+    @property
+    def retryable(self):
+        import openai
+
+        return (openai.error.Timeout, openai.error.APIConnectionError, openai.error.RateLimitError,
+                openai.error.ServiceUnavailableError, openai.error.APIError)
+
+    def complete(self, messages, timeout=None):
+        import openai
+
+        if openai.api_key is None:
+            openai.api_key = os.getenv("OPENAI_API_KEY")
+        response = openai.ChatCompletion.create(model=self.model, messages=messages, request_timeout=timeout)
+        return response['choices'][0]['message']['content']
+
+
+# Offline backend that answers from the summary itself, for tests and local runs without an API key
+class StubBackend:
+    name = "stub"
+    retryable = ()
+
+    def complete(self, messages, timeout=None):
+        summary = messages[-1]["content"]
+        first_line = next((line for line in summary.splitlines() if line.startswith("Rows:")), "")
+        return f"Offline summary (no language model called). {first_line}".strip()
+
+
+# Backend chosen by the BIAS_DETECTOR_LLM_BACKEND environment variable ("openai" or "stub")
+def default_backend():
+    if os.getenv("BIAS_DETECTOR_LLM_BACKEND", "openai").lower() == "stub":
+        return StubBackend()
+    return OpenAIBackend()
+
+
+# Model responses per (dataset, prompt version, backend), kept in a SharedCache so every session and worker
+# process of a deployment pays for a given request once. The store is bounded and evicts like the result cache.
+class ResponseCache:
+    def __init__(self, directory=None, max_bytes=DEFAULT_CACHE_MAX_BYTES, ttl_seconds=DEFAULT_CACHE_TTL_SECONDS):
+        directory = directory or os.getenv("BIAS_DETECTOR_CACHE_DIR") or DEFAULT_CACHE_DIR
+        self.store = SharedCache(directory, max_bytes=max_bytes, ttl_seconds=ttl_seconds)
+
+    def key(self, dataset_key, backend_name):
+        raw = f"{dataset_key}\0{PROMPT_VERSION}\0{backend_name}".encode()
+        return hashlib.sha256(raw).hexdigest()
+
+    def get(self, key):
+        entry = self.store.get(key)
+        if entry is None:
+            return None
+        try:
+            return json.loads(entry[1])["response"]
+        except (ValueError, KeyError):
+            return None
+
+    def put(self, key, response):
+        payload = json.dumps({"prompt_version": PROMPT_VERSION, "response": response}).encode()
+        self.store.put(key, "json", payload)
+
+    def stats(self):
+        return self.store.stats()
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+# ResponseCache shared by every request in the process, so its index connections are reused
+def default_response_cache():
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache()
+        return _response_cache
+
+
+# Call the backend, retrying transient errors with exponential backoff until cancelled
+def complete_with_retry(backend, messages, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES,
+                        backoff=DEFAULT_BACKOFF, cancel_event=None):
+    cancel_event = cancel_event or threading.Event()
+    for attempt in range(retries + 1):
+        if cancel_event.is_set():
+            raise RequestCancelled()
+        try:
+            return backend.complete(messages, timeout=timeout)
+        except backend.retryable:
+            if attempt == retries:
+                raise
+        # Event.wait returns early (True) when the request is cancelled during the backoff
+        if cancel_event.wait(backoff * 2 ** attempt):
+            raise RequestCancelled()
+
+
+# Summarize the dataset within the token budget and ask the model what the study shows.
+# dataset_key should identify the dataset (e.g. the upload fingerprint); by default the summary is hashed.
+def detect_bias(data, backend=None, cache=None, dataset_key=None, token_budget=DEFAULT_TOKEN_BUDGET,
+                total_rows=None, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF,
+                cancel_event=None):
+    backend = backend or default_backend()
+    with span("summarize_dataset", rows=len(data)):
+        summary = summarize_dataset(data, token_budget=token_budget, total_rows=total_rows)
+    if dataset_key is None:
+        dataset_key = hashlib.sha256(summary.encode()).hexdigest()
+    dataset_key = f"{dataset_key}:{token_budget}"
+
+    cache = cache or default_response_cache()
+    key = cache.key(dataset_key, backend.name)
+    with span("detect_bias", backend=backend.name) as stage:
+        response = cache.get(key)
+        stage.attributes["cached"] = response is not None
+        if response is None:
+            response = complete_with_retry(backend, build_messages(summary), timeout, retries, backoff,
+                                           cancel_event)
+            cache.put(key, response)
+    return response
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+# Thread pool shared by every background model request in the process
+def background_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_BACKGROUND_REQUESTS, thread_name_prefix="detect-bias")
+        return _executor
+
+
+# A detect_bias call running in the background
+class SummaryJob:
+    def __init__(self, key, future, cancel_event):
+        self.key = key
+        self.future = future
+        self.cancel_event = cancel_event
+
+    def done(self):
+        return self.future.done()
+
+    def result(self):
+        return self.future.result()
+
+    def cancel(self):
+        self.cancel_event.set()
+        self.future.cancel()
+
+
+# Start detect_bias on the shared thread pool; key identifies what the job is for
+def submit_detect_bias(key, data, **kwargs):
+    cancel_event = threading.Event()
+    future = background_executor().submit(detect_bias, data, cancel_event=cancel_event, **kwargs)
+    return SummaryJob(key, future, cancel_event)
@@ -0,0 +1,389 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from bias_model import bias_report, iter_page_text, read_pdf_bytes
+from scanner import LEXICON, PaperScan, compiled_lexicon
+
+# Where the paper index is kept
+DEFAULT_INDEX_PATH = os.path.join(".cache", "papers.sqlite")
+
+# Bump whenever the schema or what is extracted per page changes; older indexes are rebuilt
+INDEX_VERSION = 2
+
+# Seconds a writer waits for another process to release the index
+SQLITE_BUSY_TIMEOUT = 30
+
+# Page numbers are packed into the low bits of full-text rowids, so a paper's pages form one rowid range
+PAGE_BITS = 24
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS papers (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    digest TEXT NOT NULL UNIQUE,
+    pages INTEGER NOT NULL,
+    cohort_size INTEGER,
+    bias_score REAL,
+    report TEXT NOT NULL,
+    added REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS papers_path ON papers (path);
+-- Every lexicon term found, per page
+CREATE TABLE IF NOT EXISTS mentions (
+    paper_id INTEGER NOT NULL REFERENCES papers (id) ON DELETE CASCADE,
+    page INTEGER NOT NULL,
+    dimension TEXT NOT NULL,
+    grp TEXT NOT NULL,
+    count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS mentions_paper ON mentions (paper_id);
+CREATE INDEX IF NOT EXISTS mentions_group ON mentions (grp, paper_id);
+-- Every percentage reported for a group, with the page it appears on
+CREATE TABLE IF NOT EXISTS shares (
+    paper_id INTEGER NOT NULL REFERENCES papers (id) ON DELETE CASCADE,
+    page INTEGER NOT NULL,
+    dimension TEXT NOT NULL,
+    grp TEXT NOT NULL,
+    percent REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS shares_paper ON shares (paper_id, grp);
+-- The share each paper reports for a group (the median over its pages), which share queries range over
+CREATE TABLE IF NOT EXISTS paper_shares (
+    paper_id INTEGER NOT NULL REFERENCES papers (id) ON DELETE CASCADE,
+    dimension TEXT NOT NULL,
+    grp TEXT NOT NULL,
+    share REAL NOT NULL,
+    PRIMARY KEY (grp, share, paper_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS paper_shares_paper ON paper_shares (paper_id);
+-- Full-text index of page text; the rowid packs the paper id and page number (see _text_rowid)
+CREATE VIRTUAL TABLE IF NOT EXISTS page_text USING fts5 (text);
+"""
+
+OPERATORS = {"<": "<", "<=": "<=", ">": ">", ">=": ">=", "=": "="}
+
+# "<10% Hispanic", ">= 50 % female", "Black < 5%"
+_SHARE_QUERY = re.compile(r"^\s*(?:(?P<op>[<>]=?|=)\s*(?P<value>\d+(?:\.\d+)?)\s*%?\s+(?P<group>.+?)"
+                          r"|(?P<group_first>.+?)\s*(?P<op_after>[<>]=?|=)\s*(?P<value_after>\d+(?:\.\d+)?)\s*%?)\s*$")
+
+
+# Everything extracted from one PDF: its digest, per-page scans and the paper-level bias report
+@dataclass
+class PaperExtract:
+    path: str
+    digest: str
+    pages: list = field(default_factory=list)
+    report: dict = None
+
+
+# One paper matching a query, with the pages that support the match
+@dataclass
+class PaperHit:
+    path: str
+    pages: list
+    share: float = None
+    bias_score: float = None
+
+
+def _digest(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+# Extract and scan every page of one PDF; runs in pool workers, so pages are extracted serially here
+def extract_paper(path):
+    content = read_pdf_bytes(path)
+    extract = PaperExtract(str(path), _digest(content))
+    paper = PaperScan()
+    for page, text in iter_page_text(content, workers=0):
+        scan = PaperScan().update(text)
+        extract.pages.append((page, text, scan))
+        paper.merge(scan)
+    extract.report = bias_report(paper)
+    return extract
+
+
+# Group names and every lexicon spelling, lower-cased, mapped to (dimension, group)
+def _group_lookup():
+    _, spellings = compiled_lexicon()
+    lookup = dict(spellings)
+    for dimension, groups in LEXICON.items():
+        for group in groups:
+            lookup[group.lower()] = (dimension, group)
+    return lookup
+
+
+# (dimension, group, operator, value) for a share query such as "<10% Hispanic", or None for a text search.
+# Raises ValueError when the query compares a share but names no known group.
+def parse_share_query(text):
+    match = _SHARE_QUERY.match(text)
+    if match is None:
+        return None
+    group = (match.group("group") or match.group("group_first")).strip().lower()
+    found = _group_lookup().get(group) or _group_lookup().get(group.removesuffix(" participants"))
+    if found is None:
+        raise ValueError(f"Unknown group {group!r}; share queries take a group from scanner.LEXICON")
+    if match.group("op"):
+        return (*found, match.group("op"), float(match.group("value")))
+    # "Black < 5%" reads the other way round
+    return (*found, match.group("op_after"), float(match.group("value_after")))
+
+
+# Persistent inverted index over a corpus of study papers: page text (SQLite FTS5), lexicon mentions and
+# reported group shares per page, plus each paper's bias report. Papers are keyed by content hash, so
+# re-adding an unchanged PDF is skipped and a changed one replaces its old entry.
+class PaperIndex:
+    def __init__(self, path=None):
+        self.path = path or os.getenv("BIAS_DETECTOR_PAPER_INDEX") or DEFAULT_INDEX_PATH
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != INDEX_VERSION:
+            self._rebuild()
+
+    def _rebuild(self):
+        with self.connection:
+            for table in ("page_text", "paper_shares", "shares", "mentions", "papers"):
+                self.connection.execute(f"DROP TABLE IF EXISTS {table}")
+        self.connection.executescript(SCHEMA)
+        self.connection.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def contains(self, digest):
+        return self.connection.execute("SELECT 1 FROM papers WHERE digest = ?", (digest,)).fetchone() is not None
+
+    # Index PDFs, skipping any whose content is already indexed. Extraction runs across a process pool;
+    # each paper is written in its own transaction. Yields (path, status) with status "added", "updated",
+    # "unchanged" or the error message.
+    def add(self, paths, workers=None):
+        pending = []
+        pending_digests = set()
+        for path in map(str, paths):
+            try:
+                digest = _digest(read_pdf_bytes(path))
+            except OSError as error:
+                yield path, str(error)
+                continue
+            if digest in pending_digests:
+                yield path, "unchanged"
+            elif self.contains(digest):
+                self._follow_move(path, digest)
+                yield path, "unchanged"
+            else:
+                pending.append(path)
+                pending_digests.add(digest)
+        if workers == 1 or len(pending) <= 1:
+            extracts = (self._try_extract(path) for path in pending)
+            yield from (self._store(path, extract) for path, extract in extracts)
+            return
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(extract_paper, path): path for path in pending}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    extract = future.result()
+                except Exception as error:  # noqa: BLE001 - a bad PDF shouldn't stop the rest of the corpus
+                    extract = error
+                yield self._store(path, extract)
+
+    # Point an indexed paper at its new path when its old file is gone, e.g. after a rename
+    def _follow_move(self, path, digest):
+        old_path, = self.connection.execute("SELECT path FROM papers WHERE digest = ?", (digest,)).fetchone()
+        if old_path != path and not os.path.exists(old_path):
+            with self.connection:
+                self.connection.execute("UPDATE papers SET path = ? WHERE digest = ?", (path, digest))
+
+    def _try_extract(self, path):
+        try:
+            return path, extract_paper(path)
+        except Exception as error:  # noqa: BLE001
+            return path, error
+
+    def _store(self, path, extract):
+        if isinstance(extract, Exception):
+            return path, f"{type(extract).__name__}: {extract}"
+        with self.connection:
+            if self.contains(extract.digest):
+                # Another copy of the same content was indexed meanwhile
+                return path, "unchanged"
+            # A file whose content changed replaces its old entry
+            replaced = [paper_id for paper_id, in self.connection.execute("SELECT id FROM papers WHERE path = ?",
+                                                                           (path,))]
+            self._delete(replaced)
+            paper_id = self.connection.execute(
+                "INSERT INTO papers (path, digest, pages, cohort_size, bias_score, report, added) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (path, extract.digest, len(extract.pages), extract.report["cohort_size"],
+                 extract.report["bias_score"], json.dumps(extract.report), time.time())).lastrowid
+            paper = PaperScan()
+            for page, text, scan in extract.pages:
+                paper.merge(scan)
+                self.connection.execute("INSERT INTO page_text (rowid, text) VALUES (?, ?)",
+                                        (_text_rowid(paper_id, page), text))
+                self.connection.executemany(
+                    "INSERT INTO mentions (paper_id, page, dimension, grp, count) VALUES (?, ?, ?, ?, ?)",
+                    [(paper_id, page, dimension, group, count)
+                     for (dimension, group), count in scan.mentions.items()])
+                self.connection.executemany(
+                    "INSERT INTO shares (paper_id, page, dimension, grp, percent) VALUES (?, ?, ?, ?, ?)",
+                    [(paper_id, page, dimension, group, percent)
+                     for (dimension, group), percents in scan.percentages.items() for percent in percents])
+            self.connection.executemany(
+                "INSERT INTO paper_shares (paper_id, dimension, grp, share) VALUES (?, ?, ?, ?)",
+                [(paper_id, dimension, group, share)
+                 for dimension, shares in paper.reported_shares().items() for group, share in shares.items()])
+        return path, "updated" if replaced else "added"
+
+    # Remove papers (their mentions and shares cascade) and their page text; runs inside the caller's transaction
+    def _delete(self, paper_ids):
+        for paper_id in paper_ids:
+            self.connection.execute("DELETE FROM page_text WHERE rowid >= ? AND rowid < ?",
+                                    (_text_rowid(paper_id, 0), _text_rowid(paper_id + 1, 0)))
+            self.connection.execute("DELETE FROM papers WHERE id = ?", (paper_id,))
+
+    # Drop papers whose files no longer exist
+    def prune(self):
+        missing = [paper_id for paper_id, path in self.connection.execute("SELECT id, path FROM papers")
+                   if not os.path.exists(path)]
+        with self.connection:
+            self._delete(missing)
+        return len(missing)
+
+    # Papers whose reported share of a group satisfies `operator value`, lowest share first, each with the
+    # pages where the group's percentages were reported
+    def papers_by_share(self, group, operator, value, dimension=None):
+        if operator not in OPERATORS:
+            raise ValueError(f"Unknown operator {operator!r}; use one of {', '.join(OPERATORS)}")
+        dimension_filter = "AND s.dimension = ?" if dimension else ""
+        rows = self.connection.execute(
+            f"SELECT p.path, s.share, p.bias_score, group_concat(DISTINCT r.page) "
+            f"FROM paper_shares s JOIN papers p ON p.id = s.paper_id "
+            f"JOIN shares r ON r.paper_id = s.paper_id AND r.grp = s.grp "
+            f"WHERE s.grp = ? AND s.share {OPERATORS[operator]} ? {dimension_filter} "
+            f"GROUP BY s.paper_id ORDER BY s.share, p.path",
+            (group, value, dimension) if dimension else (group, value)).fetchall()
+        return [PaperHit(path, _pages(pages), share, bias_score) for path, share, bias_score, pages in rows]
+
+    # Papers mentioning a lexicon group at all, most mentions first
+    def papers_mentioning(self, group):
+        rows = self.connection.execute(
+            "SELECT p.path, p.bias_score, group_concat(m.page), sum(m.count) AS total "
+            "FROM mentions m JOIN papers p ON p.id = m.paper_id WHERE m.grp = ? "
+            "GROUP BY m.paper_id ORDER BY total DESC, p.path", (group,)).fetchall()
+        return [PaperHit(path, _pages(pages), bias_score=bias_score) for path, bias_score, pages, _ in rows]
+
+    # Full-text search (FTS5 query syntax, e.g. 'randomized AND "african american"') with matching pages,
+    # best-matching papers first
+    def search_text(self, query, limit=1000):
+        try:
+            matches = self.connection.execute(
+                "SELECT rowid FROM page_text WHERE page_text MATCH ? ORDER BY rank LIMIT ?", (query, limit)).fetchall()
+        except sqlite3.OperationalError as error:
+            raise ValueError(f"Invalid search {query!r}: {error}") from error
+        pages = {}
+        for rowid, in matches:
+            pages.setdefault(rowid >> PAGE_BITS, []).append(rowid & ((1 << PAGE_BITS) - 1))
+        if not pages:
+            return []
+        details = dict(
+            (paper_id, (path, bias_score)) for paper_id, path, bias_score in self.connection.execute(
+                f"SELECT id, path, bias_score FROM papers WHERE id IN ({', '.join('?' * len(pages))})", list(pages)))
+        return [PaperHit(details[paper_id][0], sorted(paper_pages), bias_score=details[paper_id][1])
+                for paper_id, paper_pages in pages.items() if paper_id in details]
+
+    # Share queries ("<10% Hispanic"), bare group names ("Pacific Islander") and otherwise full-text search
+    def query(self, text):
+        share_query = parse_share_query(text)
+        if share_query is not None:
+            dimension, group, operator, value = share_query
+            return self.papers_by_share(group, operator, value, dimension)
+        group = _group_lookup().get(text.strip().lower())
+        if group is not None:
+            return self.papers_mentioning(group[1])
+        return self.search_text(text)
+
+    def stats(self):
+        papers, pages = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(pages), 0) FROM papers").fetchone()
+        shares = self.connection.execute("SELECT COUNT(*) FROM shares").fetchone()[0]
+        return {"papers": papers, "pages": pages, "reported_shares": shares}
+
+
+def _text_rowid(paper_id, page):
+    return (paper_id << PAGE_BITS) | page
+
+
+def _pages(pages):
+    return sorted({int(page) for page in pages.split(",")}) if pages else []
+
+
+# PDFs given directly or found under directories, in a stable order
+def find_papers(paths, pattern="*.pdf", recursive=False):
+    found = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            found.extend(sorted(path.rglob(pattern) if recursive else path.glob(pattern)))
+        else:
+            found.append(path)
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index study papers and query how they report representation.")
+    parser.add_argument("--index", help=f"index database (default: {DEFAULT_INDEX_PATH})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="index PDFs, skipping unchanged ones")
+    add.add_argument("paths", nargs="+", help="PDF files or directories of PDFs")
+    add.add_argument("--pattern", default="*.pdf", help="glob for papers in directories (default: *.pdf)")
+    add.add_argument("--recursive", action="store_true", help="search subdirectories too")
+    add.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    add.add_argument("--prune", action="store_true", help="also drop papers whose files no longer exist")
+    query = commands.add_parser("query", help='e.g. "<10%% Hispanic", "Pacific Islander" or "randomized"')
+    query.add_argument("text")
+    commands.add_parser("stats", help="papers, pages and reported shares indexed")
+    args = parser.parse_args(argv)
+
+    with PaperIndex(args.index) as index:
+        if args.command == "add":
+            failures = 0
+            for path, status in index.add(find_papers(args.paths, args.pattern, args.recursive), args.workers):
+                failures += status not in ("added", "updated", "unchanged")
+                print(json.dumps({"path": path, "status": status}), flush=True)
+            if args.prune:
+                print(json.dumps({"pruned": index.prune()}))
+            return 1 if failures else 0
+        if args.command == "query":
+            try:
+                hits = index.query(args.text)
+            except ValueError as error:
+                print(error, file=sys.stderr)
+                return 2
+            for hit in hits:
+                print(json.dumps({"path": hit.path, "share": None if hit.share is None else round(hit.share, 2),
+                                  "bias_score": hit.bias_score, "pages": hit.pages}))
+            return 0
+        print(json.dumps(index.stats()))
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+import os
+
+import numpy as np
+import plotly.graph_objects as go
+
+RACE_LABELS = ["White", "Black", "Hispanic", "Asian", "Other"]
+GENDERS = ("Male", "Female")
+
+# Seed for the synthetic surfaces so every session and rerun shows the same charts
+DEFAULT_SEED = 0
+
+# Optional CSV of real participation rates with columns Gender, Race, Age, Participation
+PARTICIPATION_TABLE_ENV = "PARTICIPATION_TABLE"
+
+
+# Hypothetical participation by race and age (higher for males, highest for White participants)
+def synthetic_participation(seed=DEFAULT_SEED):
+    rng = np.random.default_rng(seed)
+    ages = np.linspace(18, 80, 100)  # 100 points between ages 18 to 80
+    races = np.arange(len(RACE_LABELS))
+    surfaces = {
+        "Male": rng.normal(60, 10, (len(races), ages.size)) + 20 * (races[:, None] == 0),
+        "Female": rng.normal(40, 10, (len(races), ages.size)) + 10 * (races[:, None] == 0),
+    }
+    return ages, RACE_LABELS, surfaces
+
+
+# Participation grids (race x age) per gender from a long-format CSV; gaps are interpolated along age
+def load_participation_table(path):
+    import pandas as pd
+
+    table = pd.read_csv(path)
+    missing = {"Gender", "Race", "Age", "Participation"} - set(table.columns)
+    if missing:
+        raise ValueError(f"{path} is missing columns: {', '.join(sorted(missing))}")
+    # Non-numeric ages or rates raise ValueError rather than failing inside the pivot
+    table["Age"] = pd.to_numeric(table["Age"])
+    table["Participation"] = pd.to_numeric(table["Participation"])
+
+    races = RACE_LABELS + sorted(set(table["Race"].astype(str)) - set(RACE_LABELS))
+    ages = np.sort(table["Age"].unique()).astype(float)
+    surfaces = {}
+    for gender in GENDERS:
+        grid = (table[table["Gender"] == gender]
+                .pivot_table(index="Race", columns="Age", values="Participation", aggfunc="mean")
+                .reindex(index=races, columns=ages))
+        surfaces[gender] = grid.interpolate(axis=1, limit_direction="both").to_numpy()
+    return ages, races, surfaces
+
+
+def surface_figure(ages, races, participation, gender):
+    X, Y = np.meshgrid(ages, np.arange(len(races)))
+    figure = go.Figure(data=[go.Surface(z=participation, x=X, y=Y, colorscale='Viridis')])
+    figure.update_layout(
+        title=f"{gender} Participation (%)",
+        scene=dict(
+            xaxis_title='Age',
+            yaxis=dict(
+                title='Race',
+                tickvals=list(range(len(races))),
+                ticktext=races
+            ),
+            zaxis_title='Participation (%)'
+        )
+    )
+    return figure
+
+
+# Table path configured through the environment (if any) and its modification time, for cache keys.
+# Raises OSError when the configured file is missing.
+def configured_table():
+    path = os.getenv(PARTICIPATION_TABLE_ENV) or None
+    return path, os.path.getmtime(path) if path else None
+
+
+# Male and female participation surfaces, from the table when one is given (ValueError when it is malformed)
+def participation_figures(table_path=None, seed=DEFAULT_SEED):
+    if table_path:
+        ages, races, surfaces = load_participation_table(table_path)
+    else:
+        ages, races, surfaces = synthetic_participation(seed)
+    return {gender: surface_figure(ages, races, surfaces[gender], gender) for gender in GENDERS}
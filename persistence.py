@@ -0,0 +1,169 @@
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+# Where feedback and quiz submissions are stored
+DEFAULT_DB_PATH = os.path.join(".cache", "submissions.sqlite")
+
+# Seconds the writer waits to gather a batch, and the most submissions written per transaction
+FLUSH_INTERVAL = 1.0
+MAX_BATCH = 500
+
+# Submissions held in memory while the writer catches up; beyond this new ones are dropped, not blocked on
+MAX_QUEUED = 10_000
+
+# Seconds a writer waits for another process to release the database
+SQLITE_BUSY_TIMEOUT = 30
+
+FEEDBACK = "feedback"
+QUIZ = "quiz"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS feedback (
+    id INTEGER PRIMARY KEY,
+    submitted REAL NOT NULL,
+    session TEXT,
+    text TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS quiz_submissions (
+    id INTEGER PRIMARY KEY,
+    submitted REAL NOT NULL,
+    session TEXT,
+    score INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    answers TEXT NOT NULL
+);
+-- Running tallies of quiz scores, updated in the same transaction as the rows they count
+CREATE TABLE IF NOT EXISTS quiz_score_counts (
+    total INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (total, score)
+) WITHOUT ROWID;
+"""
+
+
+# Aggregate quiz results for quizzes with `total` questions
+@dataclass(frozen=True)
+class QuizStats:
+    total: int
+    submissions: int
+    mean_score: float
+    # Submissions per score, from 0 to total
+    distribution: tuple
+
+    # Share of earlier submissions that scored below `score`
+    def percentile(self, score):
+        if not self.submissions:
+            return None
+        return sum(self.distribution[:score]) / self.submissions
+
+
+def _connect(path):
+    connection = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+# Queues feedback and quiz submissions in memory and writes them to SQLite in batches on a background thread,
+# so a button press never waits on disk. Every process has its own writer; WAL mode and the busy timeout let
+# the writers of several worker processes share one database. Quiz score tallies are kept up to date as
+# batches are written, so statistics never scan the submissions themselves.
+class SubmissionWriter:
+    def __init__(self, path=None, flush_interval=FLUSH_INTERVAL, max_batch=MAX_BATCH, max_queued=MAX_QUEUED):
+        self.path = path or os.getenv("BIAS_DETECTOR_SUBMISSIONS_DB") or DEFAULT_DB_PATH
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.queue = queue.Queue(maxsize=max_queued)
+        self.dropped = 0
+        self.written = 0
+        self.errors = 0
+        self._connection = _connect(self.path)
+        self._connection.executescript(SCHEMA)
+        self._reader_lock = threading.Lock()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def _start(self):
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="submission-writer", daemon=True)
+                self._thread.start()
+
+    # Returns False when the queue is full and the submission was dropped
+    def _enqueue(self, kind, row):
+        self._start()
+        try:
+            self.queue.put_nowait((kind, row))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def submit_feedback(self, text, session=None):
+        return self._enqueue(FEEDBACK, (time.time(), session, text))
+
+    def submit_quiz(self, score, total, answers, session=None):
+        return self._enqueue(QUIZ, (time.time(), session, int(score), int(total), json.dumps(answers)))
+
+    def _run(self):
+        # The writer thread has its own connection; sqlite3 connections are not shared across threads here
+        connection = _connect(self.path)
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            try:
+                self._write(connection, batch)
+                self.written += len(batch)
+            except sqlite3.Error:
+                self.errors += len(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _write(self, connection, batch):
+        feedback = [row for kind, row in batch if kind == FEEDBACK]
+        quizzes = [row for kind, row in batch if kind == QUIZ]
+        tallies = {}
+        for _, _, score, total, _ in quizzes:
+            tallies[(total, score)] = tallies.get((total, score), 0) + 1
+        with connection:
+            connection.executemany("INSERT INTO feedback (submitted, session, text) VALUES (?, ?, ?)", feedback)
+            connection.executemany("INSERT INTO quiz_submissions (submitted, session, score, total, answers) "
+                                   "VALUES (?, ?, ?, ?, ?)", quizzes)
+            connection.executemany("INSERT INTO quiz_score_counts (total, score, count) VALUES (?, ?, ?) "
+                                   "ON CONFLICT (total, score) DO UPDATE SET count = count + excluded.count",
+                                   [(total, score, count) for (total, score), count in tallies.items()])
+
+    # Wait until everything queued so far is written (e.g. at exit or in tests)
+    def flush(self):
+        if self._thread is not None and self._thread.is_alive():
+            self.queue.join()
+
+    # Quiz statistics from the running tallies; covers submissions written so far
+    def quiz_stats(self, total):
+        with self._reader_lock:
+            rows = self._connection.execute("SELECT score, count FROM quiz_score_counts WHERE total = ?",
+                                            (total,)).fetchall()
+        distribution = [0] * (total + 1)
+        for score, count in rows:
+            if 0 <= score <= total:
+                distribution[score] += count
+        submissions = sum(distribution)
+        mean = sum(score * count for score, count in enumerate(distribution)) / submissions if submissions else None
+        return QuizStats(total, submissions, mean, tuple(distribution))
@@ -0,0 +1,161 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from ingest import DEFAULT_CHUNK_ROWS, merge_counts
+from representation import DEFAULT_AGE_BINS, DEMOGRAPHIC_COLUMNS, count_tables, encode_column
+from scanner import REFERENCE_SHARES
+
+# Census shares used when no reference distribution is uploaded (see scanner.REFERENCE_SHARES)
+DEFAULT_REFERENCE = {"Race": REFERENCE_SHARES["race"], "Gender": REFERENCE_SHARES["sex"]}
+
+# Columns a reference table may hold its weights in, checked in this order
+WEIGHT_COLUMNS = ("Share", "Percent", "Proportion", "Prevalence", "Count", "Population", "Weight")
+
+# Long-format reference tables name the demographic column and group in these columns
+LONG_COLUMNS = ("Column", "Group")
+
+_erfc = np.frompyfunc(math.erfc, 1, 1)
+
+
+# Reference distribution as {column: group shares summing to 1}, from a dict of {column: {group: weight}} or
+# a CSV / DataFrame. Tables are either long (Column, Group, weight), or have demographic columns and a weight
+# per row: joint rows (Race, Gender, Age, weight) and stacked marginal rows (one column filled per row) both
+# work, since each column's weights are summed over its groups. Numeric ages are binned like the studies.
+def load_reference(source, columns=DEMOGRAPHIC_COLUMNS, age_bins=DEFAULT_AGE_BINS):
+    if isinstance(source, dict):
+        weights = {column: pd.Series(groups, dtype=np.float64) for column, groups in source.items()}
+    else:
+        table = source if isinstance(source, pd.DataFrame) else pd.read_csv(source)
+        weight_column = next((column for column in WEIGHT_COLUMNS if column in table.columns), None)
+        if weight_column is None:
+            raise ValueError(f"A reference table needs a weight column: one of {', '.join(WEIGHT_COLUMNS)}")
+        weight = pd.to_numeric(table[weight_column], errors="coerce")
+        weights = {}
+        if set(LONG_COLUMNS).issubset(table.columns):
+            for column, rows in table.groupby(LONG_COLUMNS[0], sort=False):
+                weights[str(column)] = weight[rows.index].groupby(rows[LONG_COLUMNS[1]].astype(str)).sum()
+        for column in columns:
+            if column not in table.columns or column in weights:
+                continue
+            present = table[column].notna() & weight.notna()
+            if not present.any():
+                continue
+            codes, labels = encode_column(table.loc[present, column], column, age_bins)
+            weights[column] = pd.Series(np.bincount(codes[codes >= 0], weight[present].to_numpy()[codes >= 0],
+                                                    minlength=len(labels)), index=labels)
+    reference = {}
+    for column, groups in weights.items():
+        groups = groups[groups > 0]
+        groups.index = groups.index.astype(str)
+        if not groups.empty:
+            reference[column] = groups / groups.sum()
+    if not reference:
+        raise ValueError("The reference table has no positive weights for any demographic column")
+    return reference
+
+
+# Demographic group counts of one study CSV, read in chunks (only the counts are kept)
+def count_study(file, chunk_rows=DEFAULT_CHUNK_ROWS, age_bins=DEFAULT_AGE_BINS):
+    counts = {}
+    with pd.read_csv(file, chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            for column, column_counts in count_tables(chunk, age_bins=age_bins)[0].items():
+                counts[column] = merge_counts(counts.get(column), column_counts)
+    return counts
+
+
+# Upper tail of the chi-square distribution with `dof` degrees of freedom, for a vector of statistics.
+# Closed forms for integer dof: e^(-x/2) * sum (x/2)^i / i! when dof is even, plus erfc(sqrt(x/2)) and
+# half-integer powers when it is odd.
+def chi_square_sf(statistic, dof):
+    statistic = np.asarray(statistic, dtype=np.float64)
+    if dof < 1:
+        return np.full(statistic.shape, np.nan)
+    half = np.maximum(statistic, 0) / 2
+    offset = 0.5 if dof % 2 else 0.0
+    survival = _erfc(np.sqrt(half)).astype(np.float64) if dof % 2 else np.zeros_like(half)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_half = np.log(half)
+        for i in range(dof // 2):
+            survival += np.exp((i + offset) * log_half - half - math.lgamma(i + offset + 1))
+    return np.where(np.isnan(statistic), np.nan, np.where(half == 0, 1.0, np.clip(survival, 0.0, 1.0)))
+
+
+# Studies x groups count matrix for every reference column, side by side, with the reference shares and the
+# slice of the matrix each column occupies. Groups a study has but the reference lacks are counted apart.
+def count_matrix(study_counts, reference):
+    names = list(study_counts)
+    blocks, shares, segments, unmatched = [], [], {}, {}
+    start = 0
+    for column, column_shares in reference.items():
+        table = pd.concat([study_counts[name].get(column, pd.Series(dtype=np.int64)) for name in names],
+                          axis=1, keys=range(len(names))).fillna(0)
+        table.index = table.index.astype(str)
+        matched = table.reindex(column_shares.index, fill_value=0).to_numpy(dtype=np.float64).T
+        blocks.append(matched.reshape(len(names), len(column_shares)))
+        unmatched[column] = table.to_numpy(dtype=np.float64).sum(axis=0) - blocks[-1].sum(axis=1)
+        shares.append(column_shares.to_numpy(dtype=np.float64))
+        segments[column] = slice(start, start + len(column_shares))
+        start += len(column_shares)
+    return np.hstack(blocks), np.concatenate(shares), segments, unmatched
+
+
+# Chi-square goodness of fit, KL divergence (in bits) and representation ratios of every study against the
+# reference, computed for all studies and columns at once on the stacked count matrix. Returns the ranking
+# (one row per study, most divergent first, studies without usable demographics last) and the ratio of every
+# group in every study. `study_counts` maps study names to their group counts and `reference` comes from
+# load_reference (census shares by default).
+def compare_studies(study_counts, reference=None):
+    reference = reference or load_reference(DEFAULT_REFERENCE)
+    names = list(study_counts)
+    if not names:
+        return pd.DataFrame(), pd.DataFrame()
+    counts, shares, segments, unmatched = count_matrix(study_counts, reference)
+    starts = np.array([segment.start for segment in segments.values()])
+    sizes = np.array([segment.stop - segment.start for segment in segments.values()])
+
+    totals = np.add.reduceat(counts, starts, axis=1)
+    expanded = np.repeat(totals, sizes, axis=1)
+    expected = expanded * shares
+    with np.errstate(divide="ignore", invalid="ignore"):
+        observed = counts / expanded
+        chi_square = np.add.reduceat((counts - expected) ** 2 / expected, starts, axis=1)
+        kl = np.add.reduceat(np.where(counts > 0, observed * np.log2(observed / shares), 0.0), starts, axis=1)
+        ratios = observed / shares
+    empty = totals == 0
+    chi_square[empty] = np.nan
+    kl[empty] = np.nan
+    p_values = np.column_stack([chi_square_sf(chi_square[:, position], size - 1)
+                                for position, size in enumerate(sizes)])
+
+    ranking = pd.DataFrame({"Study": names})
+    for position, (column, segment) in enumerate(segments.items()):
+        groups = reference[column].index
+        column_ratios = ratios[:, segment]
+        lowest = np.argmin(np.where(np.isnan(column_ratios), np.inf, column_ratios), axis=1)
+        all_rows = totals[:, position] + unmatched[column]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ranking[f"{column} rows"] = totals[:, position].astype(np.int64)
+            ranking[f"{column} χ²"] = chi_square[:, position]
+            ranking[f"{column} p-value"] = p_values[:, position]
+            ranking[f"{column} KL (bits)"] = kl[:, position]
+            ranking[f"{column} lowest ratio"] = column_ratios[np.arange(len(names)), lowest]
+            ranking[f"{column} least represented"] = np.where(empty[:, position], None, groups[lowest])
+            ranking[f"{column} unmatched (%)"] = np.where(all_rows > 0, unmatched[column] * 100 / all_rows, np.nan)
+    # Studies with no rows in any reference column can't be compared: they get no divergence and rank last
+    ranking.insert(1, "Divergence (bits)", np.where(empty.all(axis=1), np.nan, np.nansum(kl, axis=1)))
+    ranking = ranking.sort_values("Divergence (bits)", ascending=False, kind="stable",
+                                  na_position="last").reset_index(drop=True)
+    ranking.insert(0, "Rank", np.arange(1, len(ranking) + 1))
+
+    detail = pd.DataFrame({
+        "Study": np.repeat(names, counts.shape[1]),
+        "Column": np.tile(np.concatenate([[column] * len(reference[column]) for column in segments]), len(names)),
+        "Group": np.tile(np.concatenate([reference[column].index for column in segments]), len(names)),
+        "Study share (%)": (observed * 100).ravel(),
+        "Reference share (%)": np.tile(shares * 100, len(names)),
+        "Ratio": ratios.ravel(),
+    })
+    return ranking, detail
@@ -0,0 +1,209 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+# Demographic columns checked for over/underrepresentation
+DEMOGRAPHIC_COLUMNS = ("Race", "Age", "Gender")
+
+# Age band edges; ages below the first edge and above the last get open-ended bands
+DEFAULT_AGE_BINS = (18, 30, 45, 60, 75)
+
+# Largest joint table built for the single-pass count before falling back to per-column counts
+MAX_JOINT_CELLS = 1 << 24
+
+OVERREPRESENTED = "overrepresented"
+UNDERREPRESENTED = "underrepresented"
+SPARSE = "sparse"
+DOMINANT = "over-dominant"
+
+
+# Percentage thresholds for flagging a group
+@dataclass(frozen=True)
+class Thresholds:
+    over: float = 60.0
+    under: float = 10.0
+
+
+# Thresholds for flagging a cell of the intersectional cube. A cell is sparse when it has fewer than
+# min_count participants or less than under_ratio times the share its marginal groups predict,
+# and over-dominant when it holds more than dominant percent of the participants.
+@dataclass(frozen=True)
+class CellThresholds:
+    min_count: int = 10
+    under_ratio: float = 0.5
+    dominant: float = 50.0
+
+
+# A single over/underrepresented group
+@dataclass(frozen=True)
+class RepresentationFlag:
+    column: str
+    group: str
+    share: float
+    kind: str
+
+    def message(self):
+        label = f"Age group {self.group}" if self.column == "Age" else f"{self.group}"
+        return f"{label} participants are {self.kind} ({self.share:.2f}%)."
+
+
+# A single sparse or over-dominant combination of groups, e.g. Black / 75+ / Female
+@dataclass(frozen=True)
+class IntersectionFlag:
+    groups: tuple
+    count: int
+    share: float
+    expected_share: float
+    kind: str
+
+    def message(self):
+        label = " / ".join(f"age {group}" if column == "Age" else group for column, group in self.groups)
+        return (f"{label} participants are {self.kind} ({self.count} participants, {self.share:.2f}% "
+                f"against {self.expected_share:.2f}% expected from the separate group shares).")
+
+
+# Human-readable labels for the age bands defined by the bin edges
+def age_band_labels(age_bins=DEFAULT_AGE_BINS):
+    edges = list(age_bins)
+    labels = [f"<{edges[0]}"]
+    for low, high in zip(edges, edges[1:]):
+        labels.append(f"{low}-{high - 1}")
+    labels.append(f"{edges[-1]}+")
+    return labels
+
+
+# Factorize a demographic column into integer codes; missing values get code -1
+def encode_column(series, column, age_bins=DEFAULT_AGE_BINS):
+    if column == "Age" and age_bins is not None and pd.api.types.is_numeric_dtype(series):
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        codes = np.searchsorted(np.asarray(age_bins, dtype=np.float64), values, side="right")
+        codes[np.isnan(values)] = -1
+        return codes.astype(np.int64), pd.Index(age_band_labels(age_bins))
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Categoricals already carry integer codes; unused categories simply count zero
+        return series.cat.codes.to_numpy(dtype=np.int64), pd.Index(series.cat.categories).astype(str)
+    codes, uniques = pd.factorize(series, sort=True)
+    return codes.astype(np.int64), pd.Index(uniques).astype(str)
+
+
+# Encode every present demographic column; missing values get one extra trailing slot per column
+def _encode_columns(data, columns, age_bins):
+    present = [column for column in columns if column in data.columns]
+    encoded = [encode_column(data[column], column, age_bins) for column in present]
+    labels = [column_labels for _, column_labels in encoded]
+    codes = [np.where(c < 0, len(column_labels), c) for c, column_labels in encoded]
+    dims = tuple(len(column_labels) + 1 for column_labels in labels)
+    return present, labels, codes, dims
+
+
+# Counts of every observed combination when the dense cube is too large to allocate.
+# Rows missing any column are dropped; joint codes are counted with a hash table instead of a bincount.
+def _sparse_cube(labels, codes, dims):
+    complete = np.logical_and.reduce([c < len(column_labels) for c, column_labels in zip(codes, labels)])
+    cube_dims = tuple(dim - 1 for dim in dims)
+    joint = np.ravel_multi_index([c[complete] for c in codes], cube_dims)
+    observed = pd.Series(joint).value_counts(sort=False).sort_index()
+    cells = np.unravel_index(observed.index.to_numpy(), cube_dims)
+    return observed.to_numpy(dtype=np.int64), pd.MultiIndex(levels=labels, codes=list(cells))
+
+
+# Marginal counts of every demographic column and the intersectional cube over all of them, in one pass.
+# All columns are combined into one joint code so a single bincount yields the cube and every marginal.
+# The cube is a Series indexed by every combination of groups (rows missing any column are left out);
+# when the dense cube would exceed MAX_JOINT_CELLS only the observed combinations are listed.
+def count_tables(data, columns=DEMOGRAPHIC_COLUMNS, age_bins=DEFAULT_AGE_BINS):
+    present, labels, codes, dims = _encode_columns(data, columns, age_bins)
+    if not present:
+        return {}, pd.Series(dtype=np.int64, name="count")
+
+    if int(np.prod(dims, dtype=np.float64)) <= MAX_JOINT_CELLS:
+        joint = np.ravel_multi_index(codes, dims)
+        table = np.bincount(joint, minlength=int(np.prod(dims))).reshape(dims)
+        marginals = []
+        for axis in range(len(dims)):
+            other_axes = tuple(a for a in range(len(dims)) if a != axis)
+            marginals.append(table.sum(axis=other_axes) if other_axes else table)
+        # Drop the missing slot of every axis to keep complete rows only
+        cube_values = table[tuple(slice(0, -1) for _ in dims)].ravel()
+        cube_index = pd.MultiIndex.from_product(labels, names=present)
+    else:
+        marginals = [np.bincount(c, minlength=dim) for c, dim in zip(codes, dims)]
+        cube_values, cube_index = _sparse_cube(labels, codes, dims)
+        cube_index = cube_index.set_names(present)
+
+    counts = {}
+    for column, column_labels, marginal in zip(present, labels, marginals):
+        counts[column] = pd.Series(marginal[:-1], index=column_labels, name=column, dtype=np.int64)
+    return counts, pd.Series(cube_values, index=cube_index, name="count", dtype=np.int64)
+
+
+# Count every group of every demographic column present in the data
+def group_counts(data, columns=DEMOGRAPHIC_COLUMNS, age_bins=DEFAULT_AGE_BINS):
+    return count_tables(data, columns, age_bins)[0]
+
+
+# Count every combination of groups across the demographic columns present in the data
+def intersectional_counts(data, columns=DEMOGRAPHIC_COLUMNS, age_bins=DEFAULT_AGE_BINS):
+    return count_tables(data, columns, age_bins)[1]
+
+
+# Flag groups whose share of the non-missing rows crosses the thresholds
+def find_flags(counts, thresholds=Thresholds()):
+    flags = []
+    for column, column_counts in counts.items():
+        column_counts = column_counts[column_counts > 0].sort_values(ascending=False, kind="stable")
+        total = column_counts.sum()
+        if total == 0:
+            continue
+        shares = column_counts.to_numpy(dtype=np.float64) * 100 / total
+        for group, share in zip(column_counts.index, shares):
+            if share > thresholds.over:
+                flags.append(RepresentationFlag(column, str(group), float(share), OVERREPRESENTED))
+            elif share < thresholds.under:
+                flags.append(RepresentationFlag(column, str(group), float(share), UNDERREPRESENTED))
+    return flags
+
+
+# Compute representation flags for every demographic column in one pass
+def analyze_representation(data, columns=DEMOGRAPHIC_COLUMNS, age_bins=DEFAULT_AGE_BINS,
+                           thresholds=Thresholds()):
+    return find_flags(group_counts(data, columns, age_bins), thresholds)
+
+
+# Flag cells of the intersectional cube against the thresholds, most severe first.
+# The expected share of a cell is the product of its groups' marginal shares, so a cell is only
+# sparse by ratio when the combination is rarer than the separate groups would suggest.
+def find_intersection_flags(cube, thresholds=CellThresholds()):
+    total = cube.sum()
+    if total == 0 or cube.index.nlevels < 2:
+        return []
+    counts = cube.to_numpy(dtype=np.float64)
+    expected = np.ones(len(cube))
+    for level in range(cube.index.nlevels):
+        level_codes = cube.index.codes[level]
+        level_totals = np.bincount(level_codes, weights=counts, minlength=len(cube.index.levels[level]))
+        expected *= level_totals[level_codes] / total
+    shares = counts / total
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratios = shares / expected
+
+    # Cells whose groups never occur are already covered by the per-column flags
+    possible = expected > 0
+    sparse = possible & ((counts < thresholds.min_count) | (ratios < thresholds.under_ratio))
+    dominant = possible & (shares * 100 > thresholds.dominant)
+
+    flags = []
+    names = cube.index.names
+    for kind, mask, order in ((DOMINANT, dominant, -shares), (SPARSE, sparse & ~dominant, ratios)):
+        for position in np.flatnonzero(mask)[np.argsort(order[mask], kind="stable")]:
+            groups = tuple(zip(names, map(str, cube.index[position])))
+            flags.append(IntersectionFlag(groups, int(counts[position]), float(shares[position] * 100),
+                                          float(expected[position] * 100), kind))
+    return flags
+
+
+# Compute intersectional flags over every combination of the demographic columns in one pass
+def analyze_intersections(data, columns=DEMOGRAPHIC_COLUMNS, age_bins=DEFAULT_AGE_BINS,
+                          thresholds=CellThresholds()):
+    return find_intersection_flags(intersectional_counts(data, columns, age_bins), thresholds)
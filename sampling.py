@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+
+from representation import DEFAULT_AGE_BINS, DEMOGRAPHIC_COLUMNS, encode_column
+
+# Rows kept in the uniform part of the sample
+DEFAULT_SAMPLE_ROWS = 50_000
+
+# Rows every demographic group (Race x Age band x Gender combination) keeps, however rare it is
+DEFAULT_MIN_PER_GROUP = 50
+
+# Rows shown in a study preview
+PREVIEW_ROWS = 10
+
+MISSING_LABEL = "(missing)"
+
+
+# Algorithm R over the rows of one chunk, vectorized. `ordinals` is each row's position in its stream; rows
+# of separate streams (e.g. groups) get disjoint slots through `offsets`. Returns the chunk positions kept and
+# the slots they take; when several rows land on the same slot only the last one survives.
+def _reservoir_picks(rng, ordinals, capacity, offsets=0):
+    slots = np.where(ordinals < capacity, ordinals, rng.integers(0, ordinals + 1))
+    picked = np.flatnonzero(slots < capacity)
+    keys = (offsets + slots)[picked] if np.ndim(offsets) else offsets + slots[picked]
+    last_keys, last_rows = np.unique(keys[::-1], return_index=True)
+    return picked[::-1][last_rows], last_keys
+
+
+# One streaming pass that keeps two reservoirs: a uniform sample of `capacity` rows, and `min_per_group` rows
+# of every demographic group so small minorities stay visible in row-level plots. The sample is their union,
+# so it holds at most capacity + min_per_group rows per group. Rows keep their position in the stream, and
+# the state pickles along with the StreamingAnalysis that owns it.
+class StratifiedReservoir:
+    def __init__(self, capacity=DEFAULT_SAMPLE_ROWS, min_per_group=DEFAULT_MIN_PER_GROUP,
+                 columns=DEMOGRAPHIC_COLUMNS, age_bins=DEFAULT_AGE_BINS, seed=0):
+        self.capacity = capacity
+        self.min_per_group = min_per_group
+        self.columns = columns
+        self.age_bins = age_bins
+        self.rng = np.random.default_rng(seed)
+        self.rows = 0
+        # Group label tuples in order of first appearance, their ids and the rows seen of each
+        self.groups = []
+        self.group_ids = {}
+        self.seen = np.zeros(0, dtype=np.int64)
+        self.uniform = None
+        self.stratified = None
+        self.stratified_slots = np.zeros(0, dtype=np.int64)
+
+    # Id of every row's group; labels of new groups are registered as they appear
+    def _group_ids(self, chunk):
+        present = [column for column in self.columns if column in chunk.columns]
+        if not present:
+            return np.zeros(len(chunk), dtype=np.int64) + self._register(())
+        encoded = [encode_column(chunk[column], column, self.age_bins) for column in present]
+        # Missing values get slot 0 of their column so every row has a group
+        codes = [codes + 1 for codes, _ in encoded]
+        labels = [[MISSING_LABEL, *column_labels] for _, column_labels in encoded]
+        joint = np.ravel_multi_index(codes, tuple(len(column_labels) for column_labels in labels))
+        uniques, inverse = np.unique(joint, return_inverse=True)
+        cells = np.unravel_index(uniques, tuple(len(column_labels) for column_labels in labels))
+        lookup = np.array([
+            self._register(tuple(column_labels[cell] for column_labels, cell in zip(labels, cell_codes)))
+            for cell_codes in zip(*cells)
+        ], dtype=np.int64)
+        return lookup[inverse.ravel()]
+
+    def _register(self, group):
+        if group not in self.group_ids:
+            self.group_ids[group] = len(self.groups)
+            self.groups.append(group)
+            self.seen = np.append(self.seen, 0)
+        return self.group_ids[group]
+
+    def update(self, chunk):
+        chunk = chunk.set_axis(pd.RangeIndex(self.rows, self.rows + len(chunk)))
+        if self.uniform is None:
+            self.uniform = chunk.iloc[:0]
+            self.stratified = chunk.iloc[:0]
+        self._update_uniform(chunk)
+        self._update_stratified(chunk)
+        self.rows += len(chunk)
+
+    def _update_uniform(self, chunk):
+        rows, slots = _reservoir_picks(self.rng, self.rows + np.arange(len(chunk)), self.capacity)
+        # Slots past the current end are free, the rest replace the row stored at that position
+        keep = np.ones(len(self.uniform), dtype=bool)
+        keep[slots[slots < len(self.uniform)]] = False
+        self.uniform = pd.concat([self.uniform[keep], chunk.iloc[rows]])
+
+    def _update_stratified(self, chunk):
+        ids = self._group_ids(chunk)
+        ordinals = self.seen[ids] + pd.Series(ids).groupby(ids).cumcount().to_numpy()
+        self.seen += np.bincount(ids, minlength=len(self.seen))
+        # Every group runs its own reservoir, in slots id * min_per_group onwards
+        rows, slots = _reservoir_picks(self.rng, ordinals, self.min_per_group, ids * self.min_per_group)
+        keep = ~np.isin(self.stratified_slots, slots)
+        self.stratified = pd.concat([self.stratified[keep], chunk.iloc[rows]])
+        self.stratified_slots = np.concatenate([self.stratified_slots[keep], slots])
+
+    # Union of both reservoirs in stream order
+    def sample(self):
+        if self.uniform is None:
+            return None
+        union = pd.concat([self.uniform, self.stratified])
+        return union[~union.index.duplicated()].sort_index().reset_index(drop=True)
+
+    # Rows that cover as many groups as possible: one stored row of every group before a second of any. Groups
+    # are interleaved by their first column (e.g. Race), so even a short preview shows every race.
+    def preview(self, rows=PREVIEW_ROWS):
+        if self.uniform is None:
+            return None
+        if not self.min_per_group or not self.groups:
+            return self.uniform.sort_index().head(rows).reset_index(drop=True)
+        ids = self.stratified_slots // self.min_per_group
+        first_labels = pd.Series([group[0] if group else "" for group in self.groups])
+        interleave = first_labels.groupby(first_labels, sort=False).cumcount().to_numpy()
+        order = np.lexsort((ids, interleave[ids], self.stratified_slots % self.min_per_group))
+        return self.stratified.iloc[order[:rows]].sort_index().reset_index(drop=True)
@@ -0,0 +1,220 @@
+import re
+import statistics
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+# Terms recognised in paper text, as dimension -> group -> lower-case spellings (matched as whole words)
+LEXICON = {
+    "race": {
+        "White": ("white", "caucasian", "caucasians", "european american", "non-hispanic white"),
+        "Black": ("black", "african american", "african-american", "african americans", "non-hispanic black"),
+        "Hispanic": ("hispanic", "hispanics", "latino", "latina", "latinos", "latinx", "hispanic/latino"),
+        "Asian": ("asian", "asians", "asian american", "asian-american"),
+        "Native American": ("native american", "american indian", "alaska native", "indigenous"),
+        "Pacific Islander": ("pacific islander", "native hawaiian"),
+    },
+    "sex": {
+        "Female": ("female", "females", "women"),
+        "Male": ("male", "males", "men"),
+    },
+    "age": {
+        "Older adults": ("older adults", "elderly", "older patients", "aged 65", "65 years and older", "geriatric"),
+        "Children": ("children", "pediatric", "paediatric", "adolescents", "infants"),
+    },
+    # Design choices that make a cohort (and models trained on it) more or less trustworthy
+    "strength": {
+        "Randomized": ("randomized", "randomised", "randomly assigned"),
+        "Prospective": ("prospective",),
+        "Multicenter": ("multicenter", "multi-center", "multicentre", "multisite", "multi-site"),
+        "External validation": ("external validation", "externally validated", "independent test set"),
+        "Stratified": ("stratified", "oversampled", "oversampling"),
+        "Cross-validation": ("cross-validation", "cross validation", "cross-validated"),
+        "Representative": ("nationally representative", "population-based", "representative sample"),
+    },
+    "weakness": {
+        "Retrospective": ("retrospective",),
+        "Single center": ("single-center", "single center", "single-centre", "single site", "single-site"),
+        "Convenience sample": ("convenience sample", "convenience sampling"),
+        "Self-reported": ("self-reported", "self reported"),
+        "Small sample": ("small sample", "limited sample size", "underpowered"),
+        "Missing demographics": ("race was not reported", "ethnicity was not reported", "not collected"),
+    },
+}
+
+# Approximate US population shares (2020 census) that reported cohort shares are compared with
+REFERENCE_SHARES = {
+    "race": {"White": 57.8, "Black": 12.1, "Hispanic": 18.7, "Asian": 5.9, "Native American": 0.7,
+             "Pacific Islander": 0.2},
+    "sex": {"Female": 50.5, "Male": 49.5},
+    "age": {"Older adults": 16.8, "Children": 22.1},
+}
+
+# Groups whose representation drives the minority representation score. Children get a ratio but are not
+# scored, since most studies only enroll adults.
+MINORITY_GROUPS = {"race": ("Black", "Hispanic", "Asian", "Native American"), "sex": ("Female",),
+                   "age": ("Older adults",)}
+
+# A percentage pairs with the group after it when only these words sit between them ("12% were Black")...
+_FORWARD_GAP = re.compile(
+    r"\s*(?:of\s+(?:the\s+)?(?:participants|patients|subjects|sample|cohort|respondents)\s*)?"
+    r"(?:were|was|are|is|identified\s+as|self-identified\s+as)?\s*")
+
+# ...or with the group before it when only punctuation and a count do ("Black (12%)", "women: 54%")
+_BACKWARD_GAP = re.compile(
+    r"\s*(?:participants|patients|subjects)?\s*[:(,\-]?\s*(?:n\s*=\s*[\d,]+\s*[,;]?\s*)?\(?\s*")
+
+_PERCENT = r"(?P<percent>\d{1,3}(?:\.\d+)?)\s?%"
+_SAMPLE_SIZE = (r"\bn\s?=\s?(?P<n>\d[\d,]*)"
+                r"|(?P<count>\d{1,3}(?:,\d{3})+|\d+)\s+(?:participants|patients|subjects|individuals|adults"
+                r"|respondents|people)\b")
+
+
+# Regex alternation shaped like a trie of the terms, so shared prefixes are only tried once per position
+def _trie_pattern(terms):
+    trie = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def pattern(node):
+        branches = [re.escape(char) + pattern(child) for char, child in sorted(node.items()) if char]
+        optional = "" in node
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if optional:
+            return ("(?:" + body + ")?") if len(branches) == 1 else body + "?"
+        return body
+
+    return pattern(trie)
+
+
+# Compiled once per process: one automaton for every lexicon term plus percentages and sample sizes,
+# and the lookup from a matched spelling back to its (dimension, group). Text is lower-cased before
+# scanning, which is much cheaper than a case-insensitive pattern; the leading word boundary and
+# first-character lookahead let the engine skip most positions without trying any alternative.
+@lru_cache(maxsize=1)
+def compiled_lexicon():
+    groups = {}
+    for dimension, entries in LEXICON.items():
+        for group, spellings in entries.items():
+            for spelling in spellings:
+                groups[spelling.lower()] = (dimension, group)
+    first = re.escape("".join(sorted({term[0] for term in groups} | {"n"})))
+    pattern = (rf"\b(?=[0-9{first}])(?:{_PERCENT}|{_SAMPLE_SIZE}"
+               rf"|(?P<term>{_trie_pattern(groups)})(?![\w-]))")
+    return re.compile(pattern), groups
+
+
+def _number(text):
+    return int(text.replace(",", ""))
+
+
+# Lexicon mentions, group percentages and sample sizes accumulated over a stream of pages.
+# Each page is scanned once; scans of separate documents or page ranges combine with merge().
+class PaperScan:
+    def __init__(self):
+        self.pages = 0
+        self.mentions = Counter()
+        self.percentages = defaultdict(list)
+        self.sample_sizes = []
+
+    def update(self, text):
+        pattern, groups = compiled_lexicon()
+        text = text.lower()
+        self.pages += 1
+        previous_term = None
+        # A percentage waits for the next token: it pairs forward with a following group if only connector
+        # words sit between them ("16% were white, 19% were black"), otherwise back with the group before it
+        pending = None
+        for match in pattern.finditer(text):
+            kind = match.lastgroup
+            if kind == "term":
+                key = groups[match.group("term")]
+                self.mentions[key] += 1
+                if pending is not None and _FORWARD_GAP.fullmatch(text, pending[1], match.start()):
+                    self.percentages[key].append(pending[0])
+                else:
+                    self._settle(pending)
+                pending = None
+                previous_term = (key, match.end())
+            elif kind == "percent":
+                self._settle(pending)
+                backward = None
+                if previous_term is not None and _BACKWARD_GAP.fullmatch(text, previous_term[1], match.start()):
+                    backward = previous_term[0]
+                pending = (float(match.group("percent")), match.end(), backward)
+                previous_term = None
+            else:
+                # Sample sizes ("n = 120") may sit between a group and its percentage
+                self.sample_sizes.append(_number(match.group(kind)))
+        self._settle(pending)
+        return self
+
+    def _settle(self, pending):
+        if pending is not None and pending[2] is not None:
+            self.percentages[pending[2]].append(pending[0])
+
+    def merge(self, other):
+        self.pages += other.pages
+        self.mentions.update(other.mentions)
+        for key, values in other.percentages.items():
+            self.percentages[key].extend(values)
+        self.sample_sizes.extend(other.sample_sizes)
+        return self
+
+    # Largest reported sample size, taken as the cohort size
+    @property
+    def cohort_size(self):
+        return max(self.sample_sizes, default=None)
+
+    # Median reported share of every group, per dimension
+    def reported_shares(self):
+        shares = defaultdict(dict)
+        for (dimension, group), values in self.percentages.items():
+            shares[dimension][group] = statistics.median(values)
+        return dict(shares)
+
+
+# Reported share, reference share and their ratio for every group with a reported percentage
+def representation_ratios(scan, reference=REFERENCE_SHARES):
+    ratios = {}
+    for dimension, shares in scan.reported_shares().items():
+        if dimension not in reference:
+            continue
+        ratios[dimension] = {
+            group: {"reported": share, "reference": reference[dimension][group],
+                    "ratio": share / reference[dimension][group]}
+            for group, share in shares.items() if group in reference[dimension]
+        }
+    return ratios
+
+
+# 0-1 score of how well minority groups are represented (1 = at least their population share), or None when
+# the paper reports no shares for them
+def minority_representation_score(ratios, minority_groups=MINORITY_GROUPS):
+    capped = [min(ratios[dimension][group]["ratio"], 1.0)
+              for dimension, groups in minority_groups.items() if dimension in ratios
+              for group in groups if group in ratios[dimension]]
+    return statistics.fmean(capped) if capped else None
+
+
+# 0-1 share of the distinct methodology terms found that are strengths, or None when none are mentioned
+def methodology_score(scan):
+    strengths = sum(1 for dimension, _ in scan.mentions if dimension == "strength")
+    weaknesses = sum(1 for dimension, _ in scan.mentions if dimension == "weakness")
+    if strengths + weaknesses == 0:
+        return None
+    return strengths / (strengths + weaknesses)
+
+
+def score_label(score, good=0.8, moderate=0.5):
+    if score is None:
+        return "Unknown"
+    if score >= good:
+        return "Good"
+    if score >= moderate:
+        return "Moderate"
+    return "Poor"
@@ -0,0 +1,89 @@
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from representation import DEMOGRAPHIC_COLUMNS
+
+# Columns always stored as categoricals when they hold text, whatever their cardinality
+CATEGORICAL_COLUMNS = DEMOGRAPHIC_COLUMNS + ("Response", "Prediction")
+
+# Other text columns become categoricals when they have at most this many distinct values...
+MAX_CATEGORIES = 1000
+
+# ...and at most this many distinct values per row; the rest become Arrow-backed strings
+MAX_UNIQUE_RATIO = 0.5
+
+
+# Memory footprint of a frame before and after optimize_dtypes, with the dtype of every converted column
+@dataclass
+class SchemaReport:
+    before_bytes: int
+    after_bytes: int
+    conversions: dict = field(default_factory=dict)
+
+    @property
+    def saved_fraction(self):
+        return 1 - self.after_bytes / self.before_bytes if self.before_bytes else 0.0
+
+    def message(self):
+        return (f"Study data uses {self.after_bytes / 2 ** 20:.1f} MiB in memory, down from "
+                f"{self.before_bytes / 2 ** 20:.1f} MiB ({self.saved_fraction:.0%} smaller).")
+
+
+def _arrow_strings_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# Smallest lossless dtype for a numeric column; floats only shrink to float32 when every value survives the
+# round trip, unless lossy_floats is set
+def _compact_numeric(series, lossy_floats=False):
+    if pd.api.types.is_bool_dtype(series):
+        return series
+    if pd.api.types.is_integer_dtype(series):
+        return pd.to_numeric(series, downcast="unsigned" if series.min() >= 0 else "integer")
+    if pd.api.types.is_float_dtype(series) and series.dtype != np.float32:
+        values = series.to_numpy()
+        narrowed = values.astype(np.float32)
+        if lossy_floats or np.array_equal(narrowed.astype(values.dtype), values, equal_nan=True):
+            return pd.Series(narrowed, index=series.index, name=series.name)
+    return series
+
+
+def _compact_text(series, column, categorical_columns, max_categories, max_unique_ratio, arrow_strings):
+    unique = series.nunique(dropna=True)
+    if column in categorical_columns or (unique <= max_categories and unique <= max_unique_ratio * len(series)):
+        return series.astype("category")
+    if arrow_strings:
+        return series.astype("string[pyarrow]")
+    return series
+
+
+# Shrink a study frame loaded with default dtypes: text columns with few distinct values (and every
+# demographic and outcome column) become categoricals, other text becomes Arrow-backed strings and numbers
+# are downcast. Returns the compact frame and a SchemaReport; the input frame is left untouched.
+def optimize_dtypes(data, categorical_columns=CATEGORICAL_COLUMNS, max_categories=MAX_CATEGORIES,
+                    max_unique_ratio=MAX_UNIQUE_RATIO, lossy_floats=False, arrow_strings=None):
+    if arrow_strings is None:
+        arrow_strings = _arrow_strings_available()
+    before = int(data.memory_usage(deep=True).sum())
+    columns = {}
+    conversions = {}
+    for column in data.columns:
+        series = data[column]
+        if pd.api.types.is_numeric_dtype(series):
+            compact = _compact_numeric(series, lossy_floats)
+        elif pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+            compact = _compact_text(series, column, categorical_columns, max_categories, max_unique_ratio,
+                                    arrow_strings)
+        else:
+            compact = series
+        if compact.dtype != series.dtype:
+            conversions[column] = (str(series.dtype), str(compact.dtype))
+        columns[column] = compact
+    optimized = pd.DataFrame(columns, index=data.index)
+    return optimized, SchemaReport(before, int(optimized.memory_usage(deep=True).sum()), conversions)
@@ -0,0 +1,99 @@
+from dataclasses import dataclass, field
+
+import numpy as np
+
+RACES = ('White', 'Black', 'Hispanic', 'Asian', 'Other')
+GENDERS = ('Male', 'Female', 'Other')
+
+# Scores at or above this are reported as high severity in cohort summaries
+HIGH_SEVERITY = 70.0
+
+
+# Weightings and thresholds for the bias severity score
+@dataclass(frozen=True)
+class BiasWeights:
+    race: dict = field(default_factory=lambda: {'White': 0.1, 'Black': 0.3, 'Hispanic': 0.25, 'Asian': 0.2,
+                                                'Other': 0.15})
+    gender: dict = field(default_factory=lambda: {'Male': 0.1, 'Female': 0.25, 'Other': 0.3})
+    # Lower income tends to increase bias
+    low_income_threshold: float = 50000
+    low_income: float = 0.25
+    other_income: float = 0.1
+    # Older patients tend to experience more bias
+    older_age_threshold: float = 60
+    older_age: float = 0.2
+    other_age: float = 0.1
+
+    # Hashable so the weights can key Streamlit caches
+    def __hash__(self):
+        return hash((tuple(self.race.items()), tuple(self.gender.items()), self.low_income_threshold,
+                     self.low_income, self.other_income, self.older_age_threshold, self.older_age, self.other_age))
+
+
+# Integer codes and distinct values; pandas columns use their hash-based factorize, missing values get -1
+def _factorize(values):
+    if hasattr(values, 'factorize'):
+        codes, uniques = values.factorize()
+        return codes, [str(value) for value in uniques]
+    uniques, codes = np.unique(np.asarray(values, dtype=object).astype(str), return_inverse=True)
+    return codes, uniques.tolist()
+
+
+# Look up a weight for every value in one pass over the distinct values; unknown values give NaN
+def _category_weights(values, weights):
+    codes, uniques = _factorize(values)
+    # The trailing NaN is picked up by missing values (code -1)
+    table = np.array([weights.get(value, np.nan) for value in uniques] + [np.nan], dtype=np.float64)
+    return table[codes]
+
+
+def income_weights(income, weights=BiasWeights()):
+    return np.where(np.asarray(income, dtype=np.float64) < weights.low_income_threshold,
+                    weights.low_income, weights.other_income)
+
+
+def age_weights(age, weights=BiasWeights()):
+    return np.where(np.asarray(age, dtype=np.float64) > weights.older_age_threshold,
+                    weights.older_age, weights.other_age)
+
+
+# Bias severity (0-100) for every patient; patients is a DataFrame or a mapping of
+# Age, Income, Race and Gender columns. The score is a simple weighted sum of the four factors.
+def score_patients(patients, weights=BiasWeights()):
+    score = (_category_weights(patients['Race'], weights.race)
+             + _category_weights(patients['Gender'], weights.gender)
+             + income_weights(patients['Income'], weights)
+             + age_weights(patients['Age'], weights))
+    return score * 100
+
+
+# Distribution of scores across a cohort, overall and by race and gender
+def cohort_summary(patients, scores=None, weights=BiasWeights(), high_severity=HIGH_SEVERITY):
+    if scores is None:
+        scores = score_patients(patients, weights)
+    scored = scores[~np.isnan(scores)]
+    summary = {
+        'patients': int(scores.size),
+        'unscored': int(scores.size - scored.size),
+        'mean': float(scored.mean()) if scored.size else float('nan'),
+        'median': float(np.median(scored)) if scored.size else float('nan'),
+        'p90': float(np.percentile(scored, 90)) if scored.size else float('nan'),
+        'high_severity_share': float((scored >= high_severity).mean()) if scored.size else float('nan'),
+    }
+    for column in ('Race', 'Gender'):
+        codes, uniques = _factorize(patients[column])
+        valid = ~np.isnan(scores) & (codes >= 0)
+        totals = np.bincount(codes[valid], weights=scores[valid], minlength=len(uniques))
+        counts = np.bincount(codes[valid], minlength=len(uniques))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            summary[f'mean_by_{column.lower()}'] = dict(zip(uniques, (totals / counts).tolist()))
+    return summary
+
+
+# Scores for every combination of age x income x race x gender, as a 4-D array in that axis order
+def sensitivity_grid(ages, incomes, races=RACES, genders=GENDERS, weights=BiasWeights()):
+    age_part = age_weights(ages, weights)[:, None, None, None]
+    income_part = income_weights(incomes, weights)[None, :, None, None]
+    race_part = np.array([weights.race.get(race, np.nan) for race in races])[None, None, :, None]
+    gender_part = np.array([weights.gender.get(gender, np.nan) for gender in genders])[None, None, None, :]
+    return (age_part + income_part + race_part + gender_part) * 100
@@ -0,0 +1,106 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from representation import DEFAULT_AGE_BINS, DEMOGRAPHIC_COLUMNS, encode_column
+
+# Default size of the dataset summary sent to the language model
+DEFAULT_TOKEN_BUDGET = 2000
+
+# Rough characters-per-token ratio for English text and CSV
+CHARS_PER_TOKEN = 4
+
+# Outcome columns summarized against each demographic column
+OUTCOME_COLUMNS = ("Response",)
+
+# Most frequent values listed per categorical column
+TOP_VALUES = 5
+
+# Upper bound on sample rows considered before fitting them to the budget
+MAX_SAMPLE_ROWS = 500
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _format_number(value):
+    return f"{value:.4g}" if isinstance(value, (float, np.floating)) else str(value)
+
+
+# One line per column: dtype, missing values and either numeric stats or the top values
+def column_statistics(data, top_values=TOP_VALUES):
+    lines = []
+    for column in data.columns:
+        series = data[column]
+        missing = int(series.isna().sum())
+        header = f"- {column} ({series.dtype}, {missing} missing, {series.nunique()} unique):"
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            stats = series.describe()
+            details = ", ".join(f"{name}={_format_number(stats[name])}"
+                                for name in ("min", "mean", "50%", "max") if name in stats)
+        else:
+            shares = series.value_counts(normalize=True).head(top_values) * 100
+            details = ", ".join(f"{value}={share:.1f}%" for value, share in shares.items())
+        lines.append(f"{header} {details}")
+    return lines
+
+
+# Outcome share within each demographic group, e.g. Response by Gender
+def outcome_crosstabs(data, outcome_columns=OUTCOME_COLUMNS, age_bins=DEFAULT_AGE_BINS):
+    sections = []
+    for outcome in outcome_columns:
+        if outcome not in data.columns:
+            continue
+        for column in DEMOGRAPHIC_COLUMNS:
+            if column not in data.columns:
+                continue
+            codes, labels = encode_column(data[column], column, age_bins)
+            groups = pd.Categorical.from_codes(codes, categories=labels)
+            table = pd.crosstab(groups, data[outcome], normalize="index") * 100
+            table.index.name = column
+            sections.append(f"{outcome} by {column} (% of group):\n{table.round(1).to_csv().rstrip()}")
+    return sections
+
+
+# Shuffle rows, then interleave demographic strata so every group appears early in the sample
+def stratified_sample(data, max_rows=MAX_SAMPLE_ROWS, age_bins=DEFAULT_AGE_BINS, seed=0):
+    if data.empty:
+        return data
+    shuffled = data.sample(n=min(len(data), max_rows * 100), random_state=seed)
+    strata = {column: encode_column(shuffled[column], column, age_bins)[0]
+              for column in DEMOGRAPHIC_COLUMNS if column in shuffled.columns}
+    if not strata:
+        return shuffled.head(max_rows)
+    rank = pd.DataFrame(strata).groupby(list(strata), sort=False).cumcount()
+    order = np.argsort(rank.to_numpy(), kind="stable")[:max_rows]
+    return shuffled.iloc[order]
+
+
+# Compact text description of the dataset that fits the token budget.
+# Schema and statistics come first, then crosstabs, then as many sample rows as still fit.
+def summarize_dataset(data, token_budget=DEFAULT_TOKEN_BUDGET, total_rows=None,
+                      outcome_columns=OUTCOME_COLUMNS, age_bins=DEFAULT_AGE_BINS, seed=0):
+    rows = len(data) if total_rows is None else total_rows
+    header = f"Rows: {rows}, columns: {len(data.columns)}"
+    if rows != len(data):
+        header += f" (statistics computed on a sample of {len(data)} rows)"
+
+    sections = [header, "Columns:\n" + "\n".join(column_statistics(data))]
+    sections.extend(outcome_crosstabs(data, outcome_columns, age_bins))
+    summary = "\n\n".join(sections)
+
+    budget_chars = token_budget * CHARS_PER_TOKEN
+    if len(summary) > budget_chars:
+        return summary[:budget_chars]
+
+    sample = stratified_sample(data, age_bins=age_bins, seed=seed)
+    sample_title = "\n\nStratified sample rows (CSV):\n"
+    remaining = budget_chars - len(summary) - len(sample_title)
+    lines = sample.to_csv(index=False, float_format="%.4g").splitlines(keepends=True)
+    if len(lines) < 2 or len(lines[0]) + len(lines[1]) > remaining:
+        return summary
+    lengths = np.cumsum([len(line) for line in lines])
+    fitting = int(np.searchsorted(lengths, remaining, side="right"))
+    return summary + sample_title + "".join(lines[:fitting]).rstrip("\n")